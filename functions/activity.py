@@ -0,0 +1,66 @@
+# APPEND-ONLY USER SIGN-IN ACTIVITY AND DAILY ROLLUPS
+
+# Dependencies
+import os
+from datetime import datetime, timezone, date
+import google.cloud.firestore
+from firebase_admin import firestore
+
+ACTIVITY_COLLECTION = "activity"
+RECENT_ACTIVITY_LIMIT = int(os.getenv("RECENT_ACTIVITY_LIMIT", 20))
+ROLLUP_COLLECTION = "activity_rollups"
+
+# UTC day of a sign-in, Clerk sends epoch milliseconds
+def activity_day(active_at) -> str:
+    if isinstance(active_at, (int, float)):
+        return datetime.fromtimestamp(active_at / 1000, timezone.utc).date().isoformat()
+    return datetime.now(timezone.utc).date().isoformat()
+
+# Appends a sign-in to the user's activity log and moves the summary on the user in one transaction
+# The user only carries the last RECENT_ACTIVITY_LIMIT sign-ins in active_at, so the read stays small for heavy users
+# and arrays written before the cap are trimmed on the user's next sign-in
+def record_sign_in(firestore_client: google.cloud.firestore.Client, user_id: str, active_at) -> None:
+    user_ref = firestore_client.collection("users").document(user_id)
+
+    @firestore.transactional
+    def record(transaction: google.cloud.firestore.Transaction) -> None:
+        user = user_ref.get(field_paths=["active_at"], transaction=transaction)
+        recent = (user.to_dict() or {}).get("active_at") or []
+        if not isinstance(recent, list):
+            recent = [recent]
+
+        # Keyed by sign-in time so a retried webhook rewrites the same entry
+        transaction.set(user_ref.collection(ACTIVITY_COLLECTION).document(str(active_at)), {
+            "active_at": active_at,
+            "day": activity_day(active_at),
+            "recorded_at": firestore.SERVER_TIMESTAMP
+        })
+        summary = {
+            "active_at": ([entry for entry in recent if entry != active_at] + [active_at])[-RECENT_ACTIVITY_LIMIT:],
+            "last_active_at": firestore.Maximum(active_at) if isinstance(active_at, (int, float)) else active_at
+        }
+        if active_at not in recent:
+            summary["sign_ins"] = firestore.Increment(1)
+        transaction.set(user_ref, summary, merge=True)
+
+    record(firestore_client.transaction())
+
+# Counts sign-ins and distinct active users of a day into activity_rollups/{day}
+def rollup_activity(firestore_client: google.cloud.firestore.Client, day: date) -> dict:
+    query = (
+        firestore_client.collection_group(ACTIVITY_COLLECTION)
+        .where(filter=firestore.FieldFilter("day", "==", day.isoformat()))
+        .select([])
+    )
+    users, sign_ins = set(), 0
+    for entry in query.stream():
+        users.add(entry.reference.parent.parent.id)
+        sign_ins += 1
+    rollup = {
+        "day": day.isoformat(),
+        "active_users": len(users),
+        "sign_ins": sign_ins,
+        "computed_at": firestore.SERVER_TIMESTAMP
+    }
+    firestore_client.collection(ROLLUP_COLLECTION).document(day.isoformat()).set(rollup)
+    return rollup
@@ -0,0 +1,104 @@
+# STANCE AND PRICE ANALYTICS OVER UPDATE HISTORY
+
+# Dependencies
+import numpy as np
+import pandas as pd
+import google.cloud.firestore
+from firebase_admin import firestore
+
+STANCES = ["bearish", "neutral", "bullish"]
+DIRECTIONS = {"bearish": -1, "neutral": 0, "bullish": 1}
+SUM_COLUMNS = ["signals", "hits", "directional_return", "bullish_flips", "bullish_flip_return", "bearish_flips", "bearish_flip_return"]
+
+# Bulk-loads updates newer than a timestamp into a columnar frame
+def load_updates(firestore_client: google.cloud.firestore.Client, since=None) -> pd.DataFrame:
+    query = firestore_client.collection("updates")
+    if since is not None:
+        query = query.where(filter=firestore.FieldFilter("timestamp", ">", since))
+    query = query.order_by("timestamp").select(["symbol", "timestamp", "stance", "prev_stance", "price"])
+    rows = [update.to_dict() for update in query.stream()]
+    return pd.DataFrame({
+        "symbol": pd.Series([row.get("symbol") for row in rows], dtype="object"),
+        "timestamp": pd.to_datetime([row.get("timestamp") for row in rows], utc=True),
+        "stance": pd.Series([row.get("stance", "neutral") for row in rows], dtype="object"),
+        "prev_stance": pd.Series([row.get("prev_stance", "neutral") for row in rows], dtype="object"),
+        "price": np.array([(row.get("price") or {}).get("c", np.nan) for row in rows], dtype="float64"),
+        "is_new": np.ones(len(rows), dtype=bool)
+    })
+
+# Computes additive per-symbol signal statistics and stance transition counts
+def compute_metrics(frame: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    frame = frame.sort_values(["symbol", "timestamp"], kind="stable").reset_index(drop=True)
+
+    # Forward return from each update's price to the symbol's next update
+    next_price = frame.groupby("symbol", sort=False)["price"].shift(-1)
+    forward_return = (next_price / frame["price"] - 1).to_numpy()
+    resolved = ~np.isnan(forward_return)
+    direction = frame["stance"].map(DIRECTIONS).fillna(0).to_numpy()
+    directional = resolved & (direction != 0)
+    flip = (frame["stance"] != frame["prev_stance"]).to_numpy() & directional
+
+    stats = pd.DataFrame({
+        "symbol": frame["symbol"],
+        "signals": directional.astype(int),
+        "hits": (directional & (np.sign(forward_return) == direction)).astype(int),
+        "directional_return": np.where(directional, direction * forward_return, 0.0),
+        "bullish_flips": (flip & (direction == 1)).astype(int),
+        "bullish_flip_return": np.where(flip & (direction == 1), forward_return, 0.0),
+        "bearish_flips": (flip & (direction == -1)).astype(int),
+        "bearish_flip_return": np.where(flip & (direction == -1), forward_return, 0.0)
+    }).groupby("symbol").sum()
+
+    # Transitions are only counted once, on the update that made them
+    new = frame[frame["is_new"]]
+    transitions = pd.crosstab(new["prev_stance"], new["stance"]).reindex(index=STANCES, columns=STANCES, fill_value=0)
+
+    # Last update per symbol has no forward return yet and is carried into the next run
+    tails = frame[~resolved].groupby("symbol").tail(1)
+    return stats, transitions, tails
+
+# Derives hit rates and mean returns from summed statistics
+def summarize(stats: pd.DataFrame) -> pd.DataFrame:
+    summary = stats.copy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        summary["hit_rate"] = stats["hits"] / stats["signals"]
+        summary["mean_directional_return"] = stats["directional_return"] / stats["signals"]
+        summary["mean_return_after_bullish_flip"] = stats["bullish_flip_return"] / stats["bullish_flips"]
+        summary["mean_return_after_bearish_flip"] = stats["bearish_flip_return"] / stats["bearish_flips"]
+    return summary.replace([np.inf, -np.inf], np.nan)
+
+# Updates stored analytics with updates newer than the last checkpoint
+def update_analytics(firestore_client: google.cloud.firestore.Client) -> dict:
+    state_ref = firestore_client.collection("analytics").document("state")
+    state_doc = state_ref.get()
+    state = state_doc.to_dict() if state_doc.exists else {}
+
+    # Loads new updates, prefixed with the unresolved last update of each symbol
+    new_updates = load_updates(firestore_client, since=state.get("checkpoint"))
+    if len(new_updates) == 0:
+        return state
+    tails = pd.DataFrame(state.get("tails", []), columns=["symbol", "timestamp", "stance", "prev_stance", "price"])
+    tails["timestamp"] = pd.to_datetime(tails["timestamp"], utc=True)
+    tails["is_new"] = False
+    frame = pd.concat([tails, new_updates], ignore_index=True) if len(tails) != 0 else new_updates
+    stats, transitions, new_tails = compute_metrics(frame)
+
+    # Adds new statistics onto the stored totals
+    totals = pd.DataFrame.from_dict(state.get("totals", {}), orient="index", columns=SUM_COLUMNS)
+    totals = stats.add(totals, fill_value=0) if len(totals) != 0 else stats
+    stored_transitions = pd.DataFrame(state.get("transitions", {})).reindex(index=STANCES, columns=STANCES, fill_value=0)
+    transitions = transitions.add(stored_transitions.fillna(0), fill_value=0)
+
+    state = {
+        "checkpoint": new_updates["timestamp"].max().to_pydatetime(),
+        "tails": [
+            {**row, "timestamp": row["timestamp"].to_pydatetime()}
+            for row in new_tails[["symbol", "timestamp", "stance", "prev_stance", "price"]].to_dict(orient="records")
+        ],
+        "totals": totals.to_dict(orient="index"),
+        "transitions": transitions.astype(int).to_dict(),
+        "summary": summarize(totals).astype(object).where(lambda summary: summary.notna(), None).to_dict(orient="index"),
+        "timestamp": firestore.SERVER_TIMESTAMP
+    }
+    state_ref.set(state)
+    return state
@@ -0,0 +1,128 @@
+# OFFLINE BACKTESTING OF THE PAPER TRADING RULES
+
+# Dependencies
+import argparse
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from trading import plan_orders, ORDER_AMOUNT
+
+# Simulated brokerage account filling market orders at recorded prices
+class SimulatedBroker:
+
+    def __init__(self, cash: float, fee_bps: float = 0.0):
+        self.cash = cash
+        self.non_marginable = cash
+        self.fee_rate = fee_bps / 10000
+        self.positions: dict[str, float] = {}
+        self.last_prices: dict[str, float] = {}
+        self.fills = 0
+
+    # Buying power that does not rely on margin, short-sale proceeds raise cash but not this
+    def buying_power(self) -> float:
+        return self.non_marginable
+
+    def has_position(self, symbol: str) -> bool:
+        return self.positions.get(symbol, 0.0) != 0.0
+
+    # Moves cash and position for a fill of qty shares (negative for sells)
+    def fill(self, symbol: str, qty: float, price: float) -> None:
+        notional = qty * price
+        fee = abs(notional) * self.fee_rate
+        self.cash -= notional + fee
+        held = self.positions.get(symbol, 0.0)
+        if qty > 0:
+            # Buys and short covers are paid from non-marginable buying power
+            self.non_marginable -= notional + fee
+        else:
+            # Only proceeds of selling shares held long free buying power, the rest opens a short
+            closed = min(-qty, max(held, 0.0))
+            self.non_marginable += closed * price - fee
+        position = held + qty
+        if abs(position) < 1e-12:
+            self.positions.pop(symbol, None)
+        else:
+            self.positions[symbol] = position
+        self.fills += 1
+
+    # Executes a planned order at price
+    def execute(self, order: dict, price: float) -> None:
+        symbol = order["symbol"]
+        if order["kind"] == "liquidate":
+            self.fill(symbol, -self.positions.get(symbol, 0.0) * order["percent"] / 100, price)
+        elif order["kind"] == "buy":
+            self.fill(symbol, order["notional"] / price, price)
+        elif order["kind"] == "sell":
+            self.fill(symbol, -order["notional"] / price, price)
+
+    # Cash plus positions marked at their last seen price
+    def equity(self) -> float:
+        return self.cash + sum(qty * self.last_prices.get(symbol, 0.0) for symbol, qty in self.positions.items())
+
+# Replays updates, given as (timestamp, symbol, stance, price) tuples, through the trading rules
+def run_backtest(events: list[tuple], amount: int = ORDER_AMOUNT, starting_cash: float = 100000.0, fee_bps: float = 0.0) -> dict:
+    broker = SimulatedBroker(cash=starting_cash, fee_bps=fee_bps)
+    for _, symbol, stance, price in sorted(events, key=lambda event: (event[0], event[1])):
+        if not price or price != price:
+            continue
+        broker.last_prices[symbol] = price
+        orders = plan_orders(symbol, stance, broker.buying_power(), broker.has_position(symbol), amount=amount)
+        for order in orders:
+            broker.execute(order, price)
+    equity = broker.equity()
+    return {
+        "amount": amount,
+        "starting_cash": starting_cash,
+        "fee_bps": fee_bps,
+        "events": len(events),
+        "fills": broker.fills,
+        "cash": broker.cash,
+        "buying_power": broker.non_marginable,
+        "open_positions": len(broker.positions),
+        "equity": equity,
+        "return": equity / starting_cash - 1
+    }
+
+# Runs a backtest for every combination of parameters across a process pool
+def sweep(events: list[tuple], grid: dict[str, list], processes: int | None = None) -> list[dict]:
+    names = list(grid)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = [executor.submit(run_backtest, events, **params) for params in combinations]
+        return [future.result() for future in futures]
+
+# Loads events from stored updates in Firestore
+def load_events_firestore() -> list[tuple]:
+    from firebase_admin import initialize_app, firestore
+    from analytics import load_updates
+    initialize_app()
+    frame = load_updates(firestore.client())
+    return list(zip(frame["timestamp"].astype("int64"), frame["symbol"], frame["stance"], frame["price"]))
+
+# Loads events from a JSON lines export of updates
+def load_events_file(path: str) -> list[tuple]:
+    events = []
+    with open(path) as file:
+        for line in file:
+            update = json.loads(line)
+            events.append((update["timestamp"], update["symbol"], update["stance"], (update.get("price") or {}).get("c")))
+    return events
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replays stored updates through the paper trading rules")
+    parser.add_argument("--updates", help="JSON lines export of updates, reads Firestore when omitted")
+    parser.add_argument("--amounts", default=str(ORDER_AMOUNT), help="Comma separated notional amounts per order")
+    parser.add_argument("--cash", default="100000", help="Comma separated starting cash values")
+    parser.add_argument("--fees", default="0", help="Comma separated fees in basis points")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    events = load_events_file(args.updates) if args.updates else load_events_firestore()
+    grid = {
+        "amount": [int(value) for value in args.amounts.split(",")],
+        "starting_cash": [float(value) for value in args.cash.split(",")],
+        "fee_bps": [float(value) for value in args.fees.split(",")]
+    }
+    for result in sorted(sweep(events, grid, args.processes), key=lambda result: result["return"], reverse=True):
+        print(json.dumps(result))
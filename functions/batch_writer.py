@@ -0,0 +1,59 @@
+# BATCHED FIRESTORE WRITES
+
+# Dependencies
+import threading
+import google.cloud.firestore
+from helper import log
+
+# Firestore's limit on operations per batch commit
+MAX_BATCH_OPERATIONS = 500
+
+# Groups writes into WriteBatch commits of up to MAX_BATCH_OPERATIONS operations
+class BatchWriter:
+
+    def __init__(self, firestore_client: google.cloud.firestore.Client, max_operations: int = MAX_BATCH_OPERATIONS):
+        self.firestore_client = firestore_client
+        self.max_operations = max_operations
+        self.batch = firestore_client.batch()
+        self.pending = 0
+        self.committed = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
+
+    # Adds writes that must land in the same commit, e.g. ("set", ref, data) or ("update", ref, fields)
+    def write(self, *operations: tuple) -> None:
+        if len(operations) > self.max_operations:
+            raise ValueError(f"Cannot commit {len(operations)} operations atomically")
+        with self.lock:
+            if self.pending + len(operations) > self.max_operations:
+                self._commit()
+            for method, ref, *data in operations:
+                getattr(self.batch, method)(ref, *data)
+            self.pending += len(operations)
+
+    # Sets document in next commit
+    def set(self, ref, data: dict, merge: bool = False) -> None:
+        self.write(("set", ref, data, merge))
+
+    # Updates document fields in next commit
+    def update(self, ref, fields: dict) -> None:
+        self.write(("update", ref, fields))
+
+    # Commits any pending writes
+    def flush(self) -> None:
+        with self.lock:
+            self._commit()
+
+    def _commit(self) -> None:
+        if self.pending == 0:
+            return
+        self.batch.commit()
+        log(f"Committed batch of {self.pending} writes")
+        self.committed += self.pending
+        self.batch = self.firestore_client.batch()
+        self.pending = 0
@@ -0,0 +1,263 @@
+# LOCAL STAND-INS FOR EXTERNAL PROVIDERS USED IN BENCHMARKS
+
+# Dependencies
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+# Failure and latency injected into every response of a provider
+class FaultConfig:
+
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, throttle_rate: float = 0.0, retry_after: int = 1):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+
+# Builds a fake article mentioning symbol
+def make_article(symbol: str, name: str, index: int) -> dict:
+    return {
+        "uuid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{symbol}-{index}-{time.time() // 3600}")),
+        "title": f"{name} ({symbol}) shares move on news {index}",
+        "description": f"Analysts weigh in on {name} after update {index}.",
+        "keywords": f"{symbol}, {name}",
+        "snippet": f"{name} reported results that beat expectations.",
+        "url": f"https://news.example.com/{symbol.lower()}/{index}",
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%S.000000Z", time.gmtime()),
+        "relevance_score": 20 + index
+    }
+
+# Upcoming IPOs listed by the Finnhub stand-in's calendar
+IPO_CALENDAR_SIZE = 20
+
+# Builds a fake upcoming IPO in Finnhub's calendar shape
+def make_ipo(index: int) -> dict:
+    return {
+        "date": time.strftime("%Y-%m-%d", time.gmtime(time.time() + 3 * 24 * 60 * 60)),
+        "exchange": "NASDAQ Global",
+        "name": f"Synthetic Listing {index}",
+        "numberOfShares": 1000000,
+        "price": "10.00-12.00",
+        "status": "expected",
+        "symbol": f"IPO{index:03d}",
+        "totalSharesValue": 11000000
+    }
+
+# In-process stand-in for a Cloud Tasks queue, rejects task ids it has already seen
+class LocalTaskQueue:
+
+    def __init__(self):
+        self.tasks: list[dict] = []
+        self.task_ids: set[str] = set()
+        self.lock = threading.Lock()
+
+    def enqueue(self, data: dict, opts=None) -> str:
+        from firebase_admin import exceptions
+        task_id = getattr(opts, "task_id", None) or str(uuid.uuid4())
+        with self.lock:
+            if task_id in self.task_ids:
+                raise exceptions.AlreadyExistsError(f"Task {task_id} already exists")
+            self.task_ids.add(task_id)
+            self.tasks.append(data)
+        return task_id
+
+    # Takes every queued task
+    def drain(self) -> list[dict]:
+        with self.lock:
+            tasks, self.tasks = self.tasks, []
+        return tasks
+
+# Routes for each provider, returning (status, body)
+def finnhub_route(path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+    if path.endswith("/quote"):
+        price = 100 + random.random() * 10
+        return 200, {"c": price, "h": price + 1, "l": price - 1, "o": price, "pc": price - 0.5, "t": int(time.time())}
+    if path.endswith("/stock/profile2"):
+        symbol = query.get("symbol", ["TEST"])[0].upper()
+        return 200, {"ticker": symbol, "name": f"{symbol} Inc", "logo": "", "finnhubIndustry": "Technology", "exchange": "NASDAQ", "marketCapitalization": 1000}
+    if path.endswith("/stock/market-status"):
+        return 200, {"exchange": "US", "isOpen": True, "session": "regular", "holiday": None}
+    if path.endswith("/stock/market-holiday"):
+        return 200, {"exchange": "US", "data": []}
+    if path.endswith("/calendar/ipo"):
+        return 200, {"ipoCalendar": [make_ipo(index) for index in range(IPO_CALENDAR_SIZE)]}
+    return 404, {"message": f"Unknown path {path}"}
+
+def news_route(path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+    search = query.get("search", [""])[0]
+    groups = re.findall(r"\(([^|()]+) \| ([^()]+)\)", search)
+    if len(groups) == 0:
+        groups = [tuple(term.strip() for term in search.split("|", 1))]
+    articles = [make_article(symbol.strip(), name.strip(), index) for symbol, name in groups for index in range(3)]
+    return 200, {"meta": {"found": len(articles), "returned": len(articles), "limit": 50, "page": 1}, "data": articles}
+
+def news_extra_route(path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+    term = query.get("q", [""])[0].split(" OR ")[0]
+    return 200, {"status": "ok", "totalResults": 3, "articles": [make_article(term, term, index) for index in range(3)]}
+
+def gemini_route(path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+    prompt = "".join(part.get("text", "") for content in (body or {}).get("contents", []) for part in content.get("parts", []))
+    stance = random.choice(["bullish", "bearish", "neutral"])
+    analysis = {"summary": "Shares moved after news.", "stance": stance, "defense": "Recent coverage points this way."}
+    if "Articles by symbol" in prompt:
+        symbols = re.findall(r"^([A-Za-z0-9.\-]+): \[", prompt, flags=re.MULTILINE)
+        text = json.dumps([{**analysis, "symbol": symbol} for symbol in symbols])
+    elif "tweet" in prompt:
+        text = "Shares moved after news today."
+    else:
+        text = json.dumps(analysis)
+    return 200, {
+        "candidates": [{"content": {"parts": [{"text": text}], "role": "model"}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4, "totalTokenCount": (len(prompt) + len(text)) // 4}
+    }
+
+def alpaca_route(path: str, query: dict, body: dict | None) -> tuple[int, dict | list]:
+    if path.endswith("/v2/account"):
+        return 200, {"non_marginable_buying_power": "100000", "buying_power": "200000", "cash": "100000"}
+    if path.endswith("/v2/positions"):
+        return 200, []
+    if "/v2/positions/" in path:
+        return 404, {"code": 40410000, "message": "position does not exist"}
+    if path.endswith("/v2/orders"):
+        return 200, {"id": str(uuid.uuid4()), "client_order_id": (body or {}).get("client_order_id"), "status": "accepted"}
+    return 404, {"message": f"Unknown path {path}"}
+
+def twitter_route(path: str, query: dict, body: dict | None) -> tuple[int, dict]:
+    return 201, {"data": {"id": str(random.randint(10 ** 17, 10 ** 18)), "text": (body or {}).get("text", "")}}
+
+ROUTES = {
+    "finnhub": finnhub_route,
+    "news": news_route,
+    "news_extra": news_extra_route,
+    "gemini": gemini_route,
+    "alpaca": alpaca_route,
+    "twitter": twitter_route
+}
+
+# Environment variables pointing each provider's client at its stand-in
+BASE_URL_VARIABLES = {
+    "finnhub": "FINNHUB_BASE_URL",
+    "news": "NEWS_BASE_URL",
+    "news_extra": "NEWS_EXTRA_BASE_URL",
+    "gemini": "GOOGLE_GENAI_BASE_URL",
+    "alpaca": "ALPACA_BASE_URL",
+    "twitter": "TWITTER_BASE_URL"
+}
+
+# Recorded-style Finnhub websocket trade messages for symbols, replayed into the quote cache by the bench with quotes.replay
+def make_trade_messages(symbols: list[str], count: int, trades_per_message: int = 10) -> list[str]:
+    prices = {symbol: 100 + random.random() * 10 for symbol in symbols}
+    messages, now_ms = [], int(time.time() * 1000)
+    for index in range(count):
+        data = []
+        for offset in range(trades_per_message):
+            symbol = random.choice(symbols)
+            prices[symbol] *= 1 + random.gauss(0, 0.001)
+            data.append({"s": symbol, "p": round(prices[symbol], 2), "t": now_ms + index * trades_per_message + offset, "v": random.randint(1, 500)})
+        messages.append(json.dumps({"type": "trade", "data": data}))
+    return messages
+
+# Headlines and the symbols they should be routed to within a batch of (symbol, Finnhub name) stocks
+ROUTING_BATCH = [
+    ("F", "Ford Motor Co"),
+    ("A", "Agilent Technologies Inc"),
+    ("AAPL", "Apple Inc"),
+    ("META", "Meta Platforms Inc"),
+    ("KO", "Coca-Cola Co"),
+    ("GE", "GE Aerospace")
+]
+ROUTING_FIXTURES = [
+    ("Ford Motor Company recalls 90,000 SUVs", {"F"}),
+    ("Agilent Technologies beat estimates for the quarter", {"A"}),
+    ("Apple Inc. unveils its new lineup", {"AAPL"}),
+    ("Meta Platforms, Inc. expands its AI team", {"META"}),
+    ("Coca Cola raises its dividend", {"KO"}),
+    ("Shares of $F and (A) rise while NYSE: GE falls", {"F", "A", "GE"}),
+    ("A stock to watch as markets open", set())
+]
+
+# Articles returned for a single-symbol search that never name the symbol, all of them go to that symbol
+SINGLE_SYMBOL_BATCH = [("F", "Ford Motor Co")]
+SINGLE_SYMBOL_FIXTURES = [
+    ("Detroit automaker cuts prices on electric pickups", {"F"}),
+    ("Blue Oval dealers report strong truck demand", {"F"})
+]
+
+# HTTP server standing in for one provider, counting calls by status
+class FakeProvider:
+
+    def __init__(self, name: str, faults: FaultConfig):
+        self.name = name
+        self.faults = faults
+        self.calls = Counter()
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self) -> "FakeProvider":
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _record(self, status: int) -> None:
+        with self.lock:
+            self.calls[status] += 1
+
+    def _make_handler(self):
+        provider = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"null") if length else None
+                url = urlparse(self.path)
+                faults = provider.faults
+                time.sleep(max(0.0, random.gauss(faults.latency_ms, faults.jitter_ms)) / 1000)
+                headers = {}
+                roll = random.random()
+                if roll < faults.throttle_rate:
+                    status, payload = 429, {"message": "Too many requests"}
+                    headers["Retry-After"] = str(faults.retry_after)
+                elif roll < faults.throttle_rate + faults.error_rate:
+                    status, payload = 503, {"message": "Service unavailable"}
+                else:
+                    status, payload = ROUTES[provider.name](url.path, parse_qs(url.query), body)
+                provider._record(status)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = _respond
+            do_POST = _respond
+            do_DELETE = _respond
+
+        return Handler
+
+# Starts a stand-in for every provider, returns them keyed by provider name
+def start_fake_providers(faults: FaultConfig) -> dict[str, FakeProvider]:
+    return {name: FakeProvider(name, faults).start() for name in ROUTES}
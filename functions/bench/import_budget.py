@@ -0,0 +1,93 @@
+# IMPORT-TIME REPORT AND BUDGET FOR FUNCTION ENTRY MODULES
+#
+# Imports each entry module in a fresh interpreter with -X importtime, the way a cold instance loads it:
+#   cd functions && python -m bench.import_budget --repeats 5
+# Exits non-zero when an entry module exceeds its budget or loads an SDK that should only load on first use
+
+# Dependencies
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Cumulative import budget of each entry module in milliseconds
+ENTRY_BUDGETS_MS = {
+    "users": int(os.getenv("USERS_IMPORT_BUDGET_MS", 700)),
+    "stocks": int(os.getenv("STOCKS_IMPORT_BUDGET_MS", 800)),
+    "pipeline": int(os.getenv("PIPELINE_IMPORT_BUDGET_MS", 800)),
+    "main": int(os.getenv("MAIN_IMPORT_BUDGET_MS", 900))
+}
+
+# Heavy SDKs that no entry module may load at import time
+DEFERRED_MODULES = ["google.genai", "requests_oauthlib", "numpy", "pandas"]
+
+FUNCTIONS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Parses -X importtime output into {module: (self_us, cumulative_us)}, keeping the first import of each module
+def parse_importtime(output: str) -> dict[str, tuple[int, int]]:
+    timings = {}
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|", 2)
+        timings.setdefault(module.strip(), (int(self_us), int(cumulative_us)))
+    return timings
+
+# Imports module in a fresh interpreter, returns its import timings
+def profile_import(module: str) -> dict[str, tuple[int, int]]:
+    env = {**os.environ, "FRED_TELEMETRY": "off"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=FUNCTIONS_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+# Profiles an entry module repeats times, keeping the fastest run to discount disk cache effects
+def report_module(module: str, repeats: int, top: int) -> dict:
+    runs = [profile_import(module) for _ in range(repeats)]
+    timings = min(runs, key=lambda run: run[module][1])
+    slowest = sorted(timings.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        "module": module,
+        "cumulative_ms": round(timings[module][1] / 1000, 1),
+        "budget_ms": ENTRY_BUDGETS_MS[module],
+        "modules_loaded": len(timings),
+        "deferred_loaded": [name for name in DEFERRED_MODULES if name in timings],
+        "slowest_self_ms": [(name, round(self_us / 1000, 1)) for name, (self_us, _) in slowest]
+    }
+
+# Returns the budget violations of a module report
+def check_report(report: dict) -> list[str]:
+    violations = []
+    if report["cumulative_ms"] > report["budget_ms"]:
+        violations.append(f"{report['module']} took {report['cumulative_ms']}ms, budget is {report['budget_ms']}ms")
+    for name in report["deferred_loaded"]:
+        violations.append(f"{report['module']} loads {name} at import time")
+    return violations
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reports import time of function entry modules against a budget")
+    parser.add_argument("--modules", default=",".join(ENTRY_BUDGETS_MS))
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = [report_module(module, args.repeats, args.top) for module in args.modules.split(",")]
+    violations = [violation for report in reports for violation in check_report(report)]
+    if args.json:
+        print(json.dumps({"reports": reports, "violations": violations}, indent=2))
+    else:
+        for report in reports:
+            print(f"{report['module']}: {report['cumulative_ms']}ms of {report['budget_ms']}ms budget, {report['modules_loaded']} modules")
+            for name, self_ms in report["slowest_self_ms"]:
+                print(f"    {self_ms:>8}ms  {name}")
+        for violation in violations:
+            print(f"OVER BUDGET: {violation}")
+    sys.exit(1 if len(violations) != 0 else 0)
+
+if __name__ == "__main__":
+    main()
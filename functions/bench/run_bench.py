@@ -0,0 +1,180 @@
+# LOAD AND LATENCY BENCHMARK FOR THE HOURLY PIPELINE
+#
+# Runs against local provider stand-ins and the Firestore emulator:
+#   firebase emulators:start --only firestore
+#   cd functions && python -m bench.run_bench --sizes 10,100,1000
+
+# Dependencies
+import argparse
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from bench.fake_providers import FaultConfig, start_fake_providers, BASE_URL_VARIABLES, ROUTING_BATCH, ROUTING_FIXTURES, SINGLE_SYMBOL_BATCH, SINGLE_SYMBOL_FIXTURES, make_trade_messages, LocalTaskQueue
+
+# Returns the pth percentile of values
+def percentile(values: list[float], p: float) -> float:
+    if len(values) == 0:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+# Points provider clients at the stand-ins, must run before function modules are imported
+def configure_environment(providers: dict, emulator_host: str, project: str) -> None:
+    for name, variable in BASE_URL_VARIABLES.items():
+        os.environ[variable] = providers[name].base_url
+    for variable in ["GOOGLE_GENAI_API_KEY", "NEWS_API_KEY", "NEWS_EXTRA_API_KEY", "STOCKS_API_KEY", "MARKET_API_KEY", "MARKET_API_SECRET", "TWITTER_API_KEY", "TWITTER_API_SECRET", "TWITTER_ACCESS_TOKEN", "TWITTER_ACCESS_TOKEN_SECRET"]:
+        os.environ[variable] = "bench"
+    for variable in ["FINNHUB_RATE_LIMIT", "ALPACA_RATE_LIMIT", "NEWS_RATE_LIMIT", "NEWS_EXTRA_RATE_LIMIT"]:
+        os.environ.setdefault(variable, "1000000")
+    os.environ["NEWS_CURSORS_FIRESTORE"] = "false"
+    os.environ["FIRESTORE_EMULATOR_HOST"] = emulator_host
+    os.environ["GOOGLE_CLOUD_PROJECT"] = project
+
+# Deletes every document in the emulator database
+def reset_emulator(emulator_host: str, project: str) -> None:
+    request = urllib.request.Request(f"http://{emulator_host}/emulator/v1/projects/{project}/databases/(default)/documents", method="DELETE")
+    urllib.request.urlopen(request).read()
+
+# Seeds a synthetic watch list of size symbols
+def seed_stocks(firestore_client, size: int) -> None:
+    from batch_writer import BatchWriter
+    with BatchWriter(firestore_client) as writer:
+        for index in range(size):
+            symbol = f"SYM{index:04d}"
+            writer.set(firestore_client.collection("stocks").document(symbol.lower()), {
+                "symbol": symbol,
+                "name": f"Synthetic {index}",
+                "live_stance": "neutral",
+                "updates": []
+            })
+
+# Totals calls per provider since a snapshot of counters
+def count_calls(providers: dict, before: dict) -> dict:
+    return {name: sum(provider.calls.values()) - before.get(name, 0) for name, provider in providers.items()}
+
+# Routes the headline fixtures and returns those that reach other symbols than expected
+def check_routing() -> list[dict]:
+    from ingest import compile_matcher, route_articles
+    mismatches = []
+    for batch, fixtures in [(ROUTING_BATCH, ROUTING_FIXTURES), (SINGLE_SYMBOL_BATCH, SINGLE_SYMBOL_FIXTURES)]:
+        matcher = compile_matcher(batch)
+        for title, expected in fixtures:
+            routed = set(route_articles([{"title": title}], *matcher, batch))
+            if routed != expected:
+                mismatches.append({"title": title, "expected": sorted(expected), "routed": sorted(routed)})
+    return mismatches
+
+# Benchmarks the hourly update, update pipeline, IPO investigations and quote replay for one watch list size
+def bench_size(firestore_client, providers: dict, size: int, repeats: int, emulator_host: str, project: str) -> dict:
+    import cache
+    import ingest
+    import quotes
+    from updater import update_all_stocks
+    from dispatch import run_pipeline
+
+    from dev import enqueue_ipo_investigations, investigate
+
+    run_latencies, pipeline_latencies, updated_total, failed_total = [], [], 0, 0
+    ipo_latencies, ipos_enqueued, ipos_failed = [], 0, 0
+    replay_seconds, replayed_trades = 0.0, 0
+    before = {name: sum(provider.calls.values()) for name, provider in providers.items()}
+    started = time.perf_counter()
+    for _ in range(repeats):
+        reset_emulator(emulator_host, project)
+        cache.clear()
+        ingest.clear()
+        quotes.clear()
+        seed_stocks(firestore_client, size)
+
+        # Hourly update across the whole watch list
+        run_started = time.perf_counter()
+        updated, failed = update_all_stocks(firestore_client)
+        run_latencies.append(time.perf_counter() - run_started)
+        updated_total, failed_total = updated_total + len(updated), failed_total + len(failed)
+
+        # Update pipeline as the trigger would run it for each new update
+        def process(update):
+            update_started = time.perf_counter()
+            run_pipeline(firestore_client, update.id, update.to_dict())
+            return time.perf_counter() - update_started
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            pipeline_latencies.extend(executor.map(process, firestore_client.collection("updates").stream()))
+
+        # IPO pass as the hourly schedule and investigation tasks would run it, a second enqueue finds every IPO in flight
+        task_queue = LocalTaskQueue()
+        ipos_enqueued += enqueue_ipo_investigations(firestore_client, task_queue)
+        ipos_enqueued += enqueue_ipo_investigations(firestore_client, task_queue)
+        def run_investigation(task):
+            investigation_started = time.perf_counter()
+            try:
+                investigate(firestore_client, task["ipo"])
+                return time.perf_counter() - investigation_started, False
+            except Exception:
+                return time.perf_counter() - investigation_started, True
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            for latency, investigation_failed in executor.map(run_investigation, task_queue.drain()):
+                ipo_latencies.append(latency)
+                ipos_failed += investigation_failed
+
+        # Trade stream replayed into the quote cache, seeded by one refresh of every symbol
+        symbols = [f"SYM{index:04d}" for index in range(size)]
+        quotes.refresh_quotes(symbols)
+        messages = make_trade_messages(symbols, count=10 * size)
+        replay_started = time.perf_counter()
+        replayed_trades += quotes.replay(messages)
+        replay_seconds += time.perf_counter() - replay_started
+
+    elapsed = time.perf_counter() - started
+    return {
+        "symbols": size,
+        "repeats": repeats,
+        "updated": updated_total,
+        "failed": failed_total,
+        "update_run_p50_s": percentile(run_latencies, 50),
+        "update_run_p95_s": percentile(run_latencies, 95),
+        "update_run_p99_s": percentile(run_latencies, 99),
+        "update_throughput_symbols_per_s": size * repeats / sum(run_latencies),
+        "pipeline_p50_s": percentile(pipeline_latencies, 50),
+        "pipeline_p95_s": percentile(pipeline_latencies, 95),
+        "pipeline_p99_s": percentile(pipeline_latencies, 99),
+        "pipeline_throughput_updates_per_s": len(pipeline_latencies) / elapsed,
+        "ipos_enqueued": ipos_enqueued,
+        "ipos_failed": ipos_failed,
+        "ipo_investigation_p50_s": percentile(ipo_latencies, 50),
+        "ipo_investigation_p95_s": percentile(ipo_latencies, 95),
+        "quote_replay_trades": replayed_trades,
+        "quote_replay_trades_per_s": replayed_trades / replay_seconds if replay_seconds else float("nan"),
+        "provider_calls": count_calls(providers, before)
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the hourly pipeline against local provider stand-ins")
+    parser.add_argument("--sizes", default="10,100,1000", help="Comma separated watch list sizes (10 to 5000)")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--emulator-host", default=os.getenv("FIRESTORE_EMULATOR_HOST", "127.0.0.1:8080"))
+    parser.add_argument("--project", default="demo-fred-ai")
+    args = parser.parse_args()
+
+    providers = start_fake_providers(FaultConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.throttle_rate))
+    configure_environment(providers, args.emulator_host, args.project)
+
+    from google.auth.credentials import AnonymousCredentials
+    import google.cloud.firestore
+    firestore_client = google.cloud.firestore.Client(project=args.project, credentials=AnonymousCredentials())
+
+    mismatches = check_routing()
+    if len(mismatches) != 0:
+        print(json.dumps({"routing_mismatches": mismatches}))
+
+    try:
+        for size in [int(size) for size in args.sizes.split(",")]:
+            print(json.dumps(bench_size(firestore_client, providers, size, args.repeats, args.emulator_host, args.project)))
+    finally:
+        for provider in providers.values():
+            provider.stop()
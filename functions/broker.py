@@ -0,0 +1,124 @@
+# ALPACA ACCOUNT SNAPSHOT, LOCAL LEDGER AND ORDER SUBMISSION
+
+# Dependencies
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import quote
+from helper import post_data_alpaca, get_data_alpaca, del_data_alpaca, log
+from workers import provider_slot
+import telemetry
+
+# Seconds a snapshot of account and positions is trusted before it is fetched again
+BROKER_SNAPSHOT_TTL = int(os.getenv("BROKER_SNAPSHOT_TTL", 300))
+ORDER_WORKERS = int(os.getenv("ORDER_WORKERS", 4))
+
+# Snapshot of account and positions, kept current locally as orders are placed
+class BrokerState:
+
+    def __init__(self, account: dict, positions: list):
+        self.buying_power = float(account["non_marginable_buying_power"])
+        self.positions = {position["symbol"]: position for position in positions}
+        self.taken_at = time.time()
+        self.valid = True
+        self.lock = threading.Lock()
+
+    def is_fresh(self) -> bool:
+        return self.valid and time.time() - self.taken_at < BROKER_SNAPSHOT_TTL
+
+    def has_position(self, symbol: str) -> bool:
+        return symbol.upper() in self.positions
+
+    # Applies an order's expected effect to the ledger, callers hold lock between planning and applying
+    def apply(self, order: dict) -> None:
+        symbol = order["symbol"].upper()
+        if order["kind"] == "buy":
+            self.buying_power -= order["notional"]
+            self.positions.setdefault(symbol, {"symbol": symbol, "side": "long", "market_value": "0"})
+        elif order["kind"] == "sell":
+            self.positions.setdefault(symbol, {"symbol": symbol, "side": "short", "market_value": "0"})
+        elif order["kind"] == "liquidate":
+            position = self.positions.pop(symbol, None)
+            # Proceeds of closing a long only settle later, so buying power is left unchanged
+            if position is not None and position.get("side") == "short":
+                self.buying_power -= abs(float(position.get("market_value") or 0))
+
+    # Marks the snapshot stale so the next caller fetches the broker's real state
+    def invalidate(self) -> None:
+        self.valid = False
+
+_state: BrokerState | None = None
+_state_lock = threading.Lock()
+
+# Gets the shared broker state, fetching account and all positions when the snapshot is stale
+def get_broker_state() -> tuple[bool, BrokerState | str]:
+    global _state
+    with _state_lock:
+        if _state is None or not _state.is_fresh():
+            with provider_slot("alpaca"), telemetry.span("broker_snapshot"):
+                status, account_res = get_data_alpaca(url="v2/account")
+                if status == False:
+                    return False, account_res
+                status, positions_res = get_data_alpaca(url="v2/positions")
+                if status == False:
+                    return False, positions_res
+            _state = BrokerState(account_res, positions_res)
+        return True, _state
+
+# Sends planned order to Alpaca, returns associated action on success
+def execute_order(order: dict, client_order_id: str | None = None) -> tuple[bool, dict | str]:
+    if order["kind"] == "liquidate":
+        status, order_res = del_data_alpaca(url=f"v2/positions/{order['symbol']}?percentage={order['percent']}")
+        action = "sell"
+    else:
+        payload = {
+            "type": "market",
+            "time_in_force": "day",
+            "symbol": order["symbol"],
+            "notional": order["notional"],
+            "side": order["kind"]
+        }
+        if client_order_id is not None:
+            payload["client_order_id"] = client_order_id
+        status, order_res = post_data_alpaca(url="v2/orders", payload=payload)
+        action = order["kind"]
+        # An order with this client order id was already placed, reuse it instead of placing another
+        if status == False and client_order_id is not None and "client_order_id" in str(order_res):
+            status, order_res = get_data_alpaca(url=f"v2/orders:by_client_order_id?client_order_id={quote(client_order_id)}")
+    if status == False:
+        return False, order_res
+    log(f"Stock {'bought' if action == 'buy' else 'sold'} successfully")
+    return True, {
+        "type": "order",
+        "action": action,
+        "alpaca_order_id": order_res["id"],
+        "timestamp": datetime.now(timezone.utc)
+    }
+
+# Collects orders and submits them to Alpaca concurrently
+class OrderQueue:
+
+    def __init__(self):
+        self.orders: list[tuple[dict, str | None]] = []
+
+    def add(self, order: dict, client_order_id: str | None = None) -> None:
+        self.orders.append((order, client_order_id))
+
+    # Submits every queued order, returns (order, status, result) in queue order
+    def submit(self) -> list[tuple[dict, bool, dict | str]]:
+        def submit_one(queued: tuple[dict, str | None]) -> tuple[dict, bool, dict | str]:
+            order, client_order_id = queued
+            with provider_slot("alpaca"):
+                try:
+                    status, res = execute_order(order, client_order_id)
+                except Exception as e:
+                    status, res = False, f"{type(e).__name__}: {e}"
+            return order, status, res
+        if len(self.orders) == 0:
+            return []
+        with ThreadPoolExecutor(max_workers=min(ORDER_WORKERS, len(self.orders))) as executor:
+            results = list(executor.map(telemetry.carry(submit_one), self.orders))
+        self.orders = []
+        return results
@@ -0,0 +1,78 @@
+# CONTENT-ADDRESSED CACHE FOR MODEL RESULTS
+
+# Dependencies
+import os
+import copy
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from firebase_admin import firestore
+from helper import log
+import telemetry
+
+# Cache sizing and shared tier settings
+CACHE_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", 6 * 60 * 60))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+CACHE_USE_FIRESTORE = os.getenv("LLM_CACHE_FIRESTORE", "false").lower() == "true"
+CACHE_COLLECTION = "llm_cache"
+
+# In-memory LRU tier shared by every invocation on this instance
+_entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+_entries_lock = threading.Lock()
+
+# Builds a stable key from the prompt template, model and the set of articles
+def make_key(template: str, model: str, articles: list, *params: str) -> str:
+    article_ids = sorted({str(article.get("uuid") or article.get("url") or json.dumps(article, sort_keys=True)) for article in articles})
+    material = json.dumps([template, model, list(params), article_ids], separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+# Gets cached value from memory, then from Firestore if enabled
+def get(key: str) -> dict | None:
+    with _entries_lock:
+        if key in _entries:
+            expires_at, value = _entries[key]
+            if expires_at > time.time():
+                _entries.move_to_end(key)
+                telemetry.increment("cache_hits", tier="memory")
+                return copy.deepcopy(value)
+            del _entries[key]
+    if CACHE_USE_FIRESTORE:
+        try:
+            doc = firestore.client().collection(CACHE_COLLECTION).document(key).get()
+            if doc.exists and doc.get("expires_at") > datetime.now(timezone.utc):
+                value = doc.get("value")
+                _put_local(key, value, doc.get("expires_at").timestamp())
+                telemetry.increment("cache_hits", tier="firestore")
+                return copy.deepcopy(value)
+        except Exception as e:
+            log(f"Shared cache read failed: {e}")
+    telemetry.increment("cache_misses")
+    return None
+
+# Stores value in memory, evicting least recently used entries
+def _put_local(key: str, value: dict, expires_at: float) -> None:
+    with _entries_lock:
+        _entries[key] = (expires_at, copy.deepcopy(value))
+        _entries.move_to_end(key)
+        while len(_entries) > CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+
+# Stores value in every enabled tier
+def put(key: str, value: dict, ttl: int = CACHE_TTL_SECONDS) -> None:
+    _put_local(key, value, time.time() + ttl)
+    if CACHE_USE_FIRESTORE:
+        try:
+            firestore.client().collection(CACHE_COLLECTION).document(key).set({
+                "value": value,
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl)
+            })
+        except Exception as e:
+            log(f"Shared cache write failed: {e}")
+
+# Drops every in-memory entry
+def clear() -> None:
+    with _entries_lock:
+        _entries.clear()
@@ -1,12 +1,16 @@
 # CODE THAT IS BEING DEVELOPED FOR FRED AI FUNCTIONALITY
-from helper import get_credentials, get_timestamp, get_data_finnhub, log, post_data_alpaca
-import requests
+from helper import get_credentials, get_timestamp, get_data_finnhub, log, post_data_alpaca, send_request
 import json
+import re
+import cache
+from fred_ai import generate_content
 import google.cloud.firestore
 import google
-from firebase_admin import firestore
+from firebase_admin import firestore, functions, exceptions
 from firebase_functions.options import RetryConfig, RateLimits, SupportedRegion
-from firebase_functions import tasks_fn
+from firebase_functions import tasks_fn, scheduler_fn, https_fn
+from datetime import datetime
+from market_calendar import is_trading_day, load_holidays, MARKET_TIMEZONE
 
 # Task queue function to handle stock ipo buys
 @tasks_fn.on_task_dispatched(retry_config=RetryConfig(max_attempts=5, min_backoff_seconds=60),
@@ -67,37 +71,91 @@ def execute_ipo_order(req: tasks_fn.CallableRequest) -> str:
         return f"IPO order for {symbol} is already executed or not in 'ordered' status."
 
 
-# Finds possible IPOs to invest in
-@scheduler_fn.on_schedule(schedule="0 */1 * * *")
+# Gets news about an IPO from newsapi.org, raises when none can be fetched so the task is retried
+def get_news_extra(name: str, symbol: str) -> dict:
+    params = {
+        "searchIn": "title",
+        "q": f"{name} OR {symbol}",
+        "apiKey": get_credentials("news_extra_api_key"),
+        "sortBy": "relevancy",
+        "language": "en",
+        "from": get_timestamp(with_date=False, delta=240),
+        "pageSize": 10
+    }
+    status, response_object = send_request("news_extra", "GET", "v2/everything", params=params)
+    if status == False:
+        raise RuntimeError(f"Failed to retrieve articles for IPO {symbol}: {response_object}")
+    if len(response_object.get("articles") or []) == 0:
+        raise RuntimeError(f"No articles about IPO {symbol} yet")
+    return response_object
+
+# Task queue function to research one upcoming IPO, raised errors are retried for this IPO only
+@tasks_fn.on_task_dispatched(retry_config=RetryConfig(max_attempts=3, min_backoff_seconds=60),
+                             rate_limits=RateLimits(max_concurrent_dispatches=5))
+def investigate_ipo(req: tasks_fn.CallableRequest) -> str:
+
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    return investigate(firestore_client, req.data["ipo"])
+
+# Researches one IPO from its news and records it in ipo_updates for execute_ipo_order
+def investigate(firestore_client: google.cloud.firestore.Client, ipo: dict) -> str:
+    ipo_ref = firestore_client.collection('ipo_updates').document(ipo["symbol"])
+
+    # Skips IPOs already recorded by an earlier delivery of this task
+    if ipo_ref.get().exists:
+        return f"IPO {ipo['symbol']} is already investigated."
+
+    # Get news articles related to the IPO
+    articles = get_news_extra(ipo['name'], ipo['symbol'])['articles']
+    sources = [article['url'] for article in articles]
+
+    # Summarize the articles using Google GenAI unless they were already summarized
+    cache_key = cache.make_key("ipo_analysis:v1", "gemini-2.5-flash", articles, ipo['name'])
+    parsed_response = cache.get(cache_key)
+    if parsed_response is None:
+        response = generate_content(
+            contents=f"Review the following list of articles which mention {ipo['name']} and write a concise 100-150 word summary of all the articles combined without mentioning 'the articles'. Also choose one of the following stances (bearish, bullish, neutral) and defend it. Return the response in a structured json output which matches the following: {{ summary: __________, stance: ______________, defense: ______________ }}. Articles: {articles}",
+        )
+        response = response.text
+        parsed_response = json.loads(response[response.index("{"): response.index("}")+1])
+        cache.put(cache_key, parsed_response)
+    parsed_response["sources"] = sources
+    parsed_response["expected_price"] = ipo["price"]
+    parsed_response["status"] = "ordered"
+    parsed_response["timestamp"] = firestore.SERVER_TIMESTAMP
+    parsed_response["buy_date"] = ipo["date"]
+    parsed_response["symbol"] = ipo["symbol"]
+    parsed_response["name"] = ipo["name"]
+    parsed_response["shares_value"] = ipo["totalSharesValue"]
+    parsed_response["shares_num"] = ipo["numberOfShares"]
+
+    # Add the IPO data to Firestore
+    ipo_ref.set(parsed_response)
+    return f"IPO {ipo['symbol']} investigated successfully."
+
+# Task id of an IPO's investigation, one per symbol and day so hourly runs do not queue IPOs already in flight
+def ipo_task_id(symbol: str) -> str:
+    return f"investigate-{re.sub(r'[^A-Za-z0-9_-]', '-', symbol)}-{datetime.now(MARKET_TIMEZONE).strftime('%Y%m%d')}"
+
+# Finds possible IPOs to invest in and enqueues one investigation task per new IPO
+@scheduler_fn.on_schedule(schedule="0 9-16 * * 1-5", timezone=scheduler_fn.Timezone("America/New_York"))
 def investigate_upcoming_ipos(event: scheduler_fn.ScheduledEvent) -> https_fn.Response:
 
-    # Gets stocks in collection
+    # Skips market holidays
+    load_holidays()
+    if not is_trading_day(datetime.now(MARKET_TIMEZONE).date()):
+        log("Market is closed")
+        return
+
     firestore_client: google.cloud.firestore.Client = firestore.client()
+    log(f"Enqueued {enqueue_ipo_investigations(firestore_client, functions.task_queue('investigate_ipo'))} IPO investigations")
 
-    # Gets open ipo orders
-    def get_open_ipo_orders() -> tuple[bool, list | str]:
+# Enqueues one investigation task per upcoming IPO not investigated yet, returns number enqueued
+def enqueue_ipo_investigations(firestore_client: google.cloud.firestore.Client, task_queue) -> int:
 
-        # Gets existing IPO orders from Firestore
-        collection_ref = firestore_client.collection('ipo_updates')
-        docs = collection_ref.stream()
-        document_ids = []
-        for doc in docs:
-            document_ids.append(doc.id)
-        return document_ids
-    
-    # Gets news from newsapi.org
-    def get_news_extra(name: str, symbol: str) -> dict:
-        params = {
-            "searchIn": "title",
-            "q": f"{name} OR {symbol}",
-            "apiKey": get_credentials("news_extra_api_key"),
-            "sortBy": "relevancy",
-            "language": "en",
-            "from": get_timestamp(with_date=False, delta=240),
-            "pageSize": 10
-        }
-        response = requests.get(f"https://newsapi.org/v2/everything", params=params)
-        return response.json()
+    # Gets symbols of existing IPO orders without reading the documents
+    def get_ipo_symbols() -> set[str]:
+        return {doc_ref.id for doc_ref in firestore_client.collection('ipo_updates').list_documents()}
 
     # Gets list of upcoming IPOs
     def get_upcoming_ipos() -> tuple[bool, list | str]:
@@ -110,43 +168,24 @@ def investigate_upcoming_ipos(event: scheduler_fn.ScheduledEvent) -> https_fn.Re
         return status, upcoming_ipos_obj["ipoCalendar"] if status else upcoming_ipos_obj
 
     # Get open IPO orders
-    ipo_orders = get_open_ipo_orders()
     status, upcoming_ipos = get_upcoming_ipos()
-    
-    if status:
+    if status == False:
+        log(f"Error fetching IPOs: {upcoming_ipos}")
+        return 0
+    known_symbols = get_ipo_symbols()
+
+    # Enqueues each new IPO separately so one failure does not stop the rest
+    enqueued = 0
+    for ipo in upcoming_ipos:
+        symbol = ipo.get("symbol")
+        if not symbol or symbol in known_symbols:
+            continue
+        known_symbols.add(symbol)
         try:
-            for ipo in upcoming_ipos:
-
-                if ipo["symbol"] not in ipo_orders:
-
-                    # Get news articles related to the IPO
-                    sources = []
-                    articles = get_news_extra(ipo['name'], ipo['symbol'])['articles']
-                    for article in articles:
-                        sources.append(article['url'])
-
-                    # Summarize the articles using Google GenAI
-                    response = get_credentials("client").models.generate_content(
-                        model="gemini-2.5-flash",
-                        contents=f"Review the following list of articles which mention {ipo['name']} and write a concise 100-150 word summary of all the articles combined without mentioning 'the articles'. Also choose one of the following stances (bearish, bullish, neutral) and defend it. Return the response in a structured json output which matches the following: {{ summary: __________, stance: ______________, defense: ______________ }}. Articles: {articles}",
-                    )
-                    response = response.text
-                    parsed_response = json.loads(response[response.index("{"): response.index("}")+1])
-                    parsed_response["sources"] = sources
-                    parsed_response["expected_price"] = ipo["price"]
-                    parsed_response["status"] = "ordered"
-                    parsed_response["timestamp"] = firestore.SERVER_TIMESTAMP
-                    parsed_response["buy_date"] = ipo["date"]
-                    parsed_response["symbol"] = ipo["symbol"]
-                    parsed_response["name"] = ipo["name"]
-                    parsed_response["shares_value"] = ipo["totalSharesValue"]
-                    parsed_response["shares_num"] = ipo["numberOfShares"]
-
-                    # Add the IPO data to Firestore
-                    firestore_client.collection('ipo_updates').document(ipo["symbol"]).set(parsed_response)
-
+            task_queue.enqueue({"ipo": ipo}, functions.TaskOptions(task_id=ipo_task_id(symbol)))
+            enqueued += 1
+        except exceptions.AlreadyExistsError:
+            continue
         except Exception as e:
-            log(f"An error occurred while processing IPOs: {e}")
-    else:
-        log(f"Error fetching IPOs: {upcoming_ipos}")
-
+            log(f"Failed to enqueue investigation of IPO {symbol}: {e}")
+    return enqueued
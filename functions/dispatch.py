@@ -0,0 +1,90 @@
+# PIPELINE OF STAGES RUN FOR EACH NEW STOCK UPDATE
+
+# Dependencies
+from concurrent.futures import ThreadPoolExecutor
+import google.cloud.firestore
+from firebase_admin import firestore
+from helper import log
+import telemetry
+from executions import claim, done_entry, mark_failed, execution_ref, get_recoverable_updates
+from trading import run_trade_stage
+from tweeting import run_tweet_stage
+
+# Ordered stages run on every update, each takes the Firestore client, update id and update and returns fields to set on the update and documents to create
+STAGES = [
+    ("trade", run_trade_stage),
+    ("tweet", run_tweet_stage)
+]
+
+# Runs stage and turns any exception into a failed result
+def run_stage(name: str, stage, firestore_client: google.cloud.firestore.Client, update_id: str, update: dict) -> tuple[bool, dict | str]:
+    try:
+        with telemetry.span(f"stage.{name}", update_id=update_id, symbol=update.get("symbol")):
+            return stage(firestore_client, update_id, update)
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+# Merges stage results into one write, list fields are appended rather than replaced
+def merge_results(results: list[dict]) -> tuple[dict, list]:
+    fields, documents = {}, []
+    for res in results:
+        for field, value in res.get("fields", {}).items():
+            if isinstance(value, list):
+                fields.setdefault(field, []).extend(value)
+            else:
+                fields[field] = value
+        documents.extend(res.get("documents", []))
+    fields = {field: firestore.ArrayUnion(value) if isinstance(value, list) else value for field, value in fields.items()}
+    return fields, documents
+
+# Runs every stage for an update concurrently and commits their results together, stages already executed for the update are skipped
+@telemetry.metered("process_update")
+def run_pipeline(firestore_client: google.cloud.firestore.Client, update_id: str, update: dict) -> dict[str, tuple[bool, dict | str]]:
+
+    # Claims stages in the execution ledger so redelivered events do not repeat them
+    claimed = []
+    for name, stage in STAGES:
+        status, reason = claim(firestore_client, update_id, name)
+        if status == True:
+            claimed.append((name, stage))
+        else:
+            log(f"Skipping stage {name} for update {update_id}: {reason}")
+            telemetry.increment("stages_skipped", stage=name)
+    if len(claimed) == 0:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=len(claimed)) as executor:
+        futures = {name: executor.submit(telemetry.carry(run_stage), name, stage, firestore_client, update_id, update) for name, stage in claimed}
+    stage_results = {name: future.result() for name, future in futures.items()}
+    for name, (status, res) in stage_results.items():
+        if status == False:
+            log(f"Stage {name} failed for update {update_id}: {res}")
+            mark_failed(firestore_client, update_id, name, str(res))
+
+    # Writes merged fields, created documents and completed stages in one commit
+    succeeded = [name for name, (status, _) in stage_results.items() if status == True]
+    fields, documents = merge_results([stage_results[name][1] for name in succeeded])
+    batch = firestore_client.batch()
+    if len(fields) != 0:
+        batch.update(firestore_client.collection("updates").document(update_id), fields)
+    for collection, data in documents:
+        batch.set(firestore_client.collection(collection).document(), data)
+    for name in succeeded:
+        batch.set(execution_ref(firestore_client, update_id, name), done_entry(update_id, name), merge=True)
+    if len(succeeded) != 0:
+        with telemetry.span("firestore_writes", update_id=update_id):
+            batch.commit()
+    return stage_results
+
+# Reruns the pending stages of updates left failed or abandoned, since update triggers are not redelivered, returns updates rerun
+@telemetry.metered("recover_updates")
+def recover_updates(firestore_client: google.cloud.firestore.Client) -> int:
+    recovered = 0
+    for update_id in get_recoverable_updates(firestore_client):
+        update = firestore_client.collection("updates").document(update_id).get()
+        if not update.exists:
+            continue
+        run_pipeline(firestore_client, update_id, update.to_dict())
+        recovered += 1
+    telemetry.increment("updates_recovered", recovered)
+    return recovered
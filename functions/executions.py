@@ -0,0 +1,81 @@
+# EXECUTION LEDGER MAKING UPDATE STAGES RUN ONCE PER UPDATE
+
+# Dependencies
+import os
+from datetime import datetime, timezone, timedelta
+import google.cloud.firestore
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition
+from firebase_admin import firestore
+
+EXECUTION_COLLECTION = "executions"
+
+# Seconds after which a started execution is presumed crashed and may be taken over
+EXECUTION_STALE_SECONDS = int(os.getenv("EXECUTION_STALE_SECONDS", 540))
+
+# Attempts a stage gets before the recovery sweep leaves it failed
+EXECUTION_MAX_ATTEMPTS = int(os.getenv("EXECUTION_MAX_ATTEMPTS", 3))
+
+# Reference of the ledger entry for an update's stage
+def execution_ref(firestore_client: google.cloud.firestore.Client, update_id: str, stage: str) -> google.cloud.firestore.DocumentReference:
+    return firestore_client.collection(EXECUTION_COLLECTION).document(f"{update_id}_{stage}")
+
+# Claims an update's stage for this delivery, returns False when it is done or running elsewhere
+def claim(firestore_client: google.cloud.firestore.Client, update_id: str, stage: str) -> tuple[bool, str]:
+    ref = execution_ref(firestore_client, update_id, stage)
+    entry = {
+        "update_id": update_id,
+        "stage": stage,
+        "status": "started",
+        "started_at": datetime.now(timezone.utc)
+    }
+    try:
+        ref.create({**entry, "attempts": 1})
+        return True, "claimed"
+    except AlreadyExists:
+        pass
+
+    # Takes over failed or abandoned executions, guarded against a concurrent takeover
+    doc = ref.get()
+    execution = doc.to_dict() or {}
+    if execution.get("status") == "done":
+        return False, "already executed"
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=EXECUTION_STALE_SECONDS)
+    if execution.get("status") == "started" and execution.get("started_at") and execution["started_at"] > stale_before:
+        return False, "already running"
+    try:
+        ref.update({**entry, "attempts": firestore.Increment(1)}, option=firestore_client.write_option(last_update_time=doc.update_time))
+        return True, "taken over"
+    except FailedPrecondition:
+        return False, "claimed by another delivery"
+
+# Ledger write marking a stage done, added to the commit that records the stage's results
+def done_entry(update_id: str, stage: str) -> dict:
+    return {
+        "update_id": update_id,
+        "stage": stage,
+        "status": "done",
+        "completed_at": firestore.SERVER_TIMESTAMP
+    }
+
+# Marks a stage failed so the recovery sweep retries it
+def mark_failed(firestore_client: google.cloud.firestore.Client, update_id: str, stage: str, error: str) -> None:
+    execution_ref(firestore_client, update_id, stage).set({
+        "status": "failed",
+        "error": error,
+        "failed_at": firestore.SERVER_TIMESTAMP
+    }, merge=True)
+
+# Ids of updates with a failed stage or one abandoned by a crashed invocation, stages out of attempts are marked abandoned instead
+def get_recoverable_updates(firestore_client: google.cloud.firestore.Client) -> list[str]:
+    query = firestore_client.collection(EXECUTION_COLLECTION).where(filter=firestore.FieldFilter("status", "in", ["started", "failed"]))
+    stale_before = datetime.now(timezone.utc) - timedelta(seconds=EXECUTION_STALE_SECONDS)
+    update_ids = {}
+    for doc in query.stream():
+        execution = doc.to_dict()
+        if execution["status"] == "started" and execution.get("started_at") and execution["started_at"] > stale_before:
+            continue
+        if execution.get("attempts", 1) >= EXECUTION_MAX_ATTEMPTS:
+            doc.reference.update({"status": "abandoned"})
+            continue
+        update_ids[execution["update_id"]] = True
+    return list(update_ids)
@@ -1,71 +1,199 @@
 # MAIN BACKEND CODE FOR CORE FRED AI FUNCTIONALITY
 
 # Dependencies
-import requests
+import os
 import json
-from helper import get_timestamp, get_data_finnhub, get_credentials
-
-# Gets updates regarding stock (recurring)
-def get_stock_updates(symbol: str, name: str):
-
-    # Gets stock price from finnhub
-    def get_stock_price() -> tuple[bool, list]:
-        params = {
-            "symbol": symbol,
-            "token": get_credentials("stocks_api_key"),
-        }
-        return get_data_finnhub(url="api/v1/quote", params=params)
-
-    # Gets news from a news api
-    def get_news_elsewhere() -> tuple[bool, list]:
-        params = {
-            "api_token": get_credentials("news_api_key"),
-            "search": f"{symbol} | {name}",
-            "search_fields": "title,description,keywords,main_text",
-            "language": "en",
-            "published_on": get_timestamp(),
-            "published_after": get_timestamp(with_date=True, delta=1),
-            "categories": "business"
-        }
-        response = requests.get("https://api.thenewsapi.com/v1/news/all", params=params)
-        response_object = response.json()
-        if "data" in response_object:
-            return True, response.json()["data"]
-        return False, "Failed to retrieve articles"
-
-    # Analyzes articles to summarize
-    def analyze_news(articles: list) -> tuple[bool, dict]:
-
-        # Calculates mean relevance of articles to identify whether or not to post the data
-        sources = []
-        parsed_articles = []
-        for article in articles:
-            if article["relevance_score"] > 15:
-                parsed_articles.append(article)
-                sources.append(article["url"])
-
-        # Generates AI summary
-        if len(parsed_articles) != 0:
-            response = get_credentials("client").models.generate_content(
-                model="gemini-2.5-flash",
-                contents=f"Review the following list of articles which mention {symbol} and write a concise 100-150 word summary of all the articles combined without mentioning 'the articles'. Also choose one of the following stances (bearish, bullish, neutral) and defend it. Return the response in a structured json output which matches the following: {{ summary: __________, stance: ______________, defense: ______________ }}. Articles: {articles}",
+from google.genai import types
+from helper import get_credentials, log
+from ingest import get_new_articles_batch
+from relevance import select_articles
+from workers import provider_slot, run_concurrently
+import cache
+from quotes import get_quote, refresh_quotes
+import telemetry
+
+# Model used for news analysis and number of symbols analyzed per batched call
+MODEL = "gemini-2.5-flash"
+ANALYSIS_BATCH_SIZE = int(os.getenv("ANALYSIS_BATCH_SIZE", 10))
+STANCES = ("bearish", "bullish", "neutral")
+ANALYSIS_TEMPLATE = "stock_analysis:v1"
+
+# Schema of a batched analysis response, one entry per symbol
+BATCH_ANALYSIS_SCHEMA = types.Schema(
+    type=types.Type.ARRAY,
+    items=types.Schema(
+        type=types.Type.OBJECT,
+        properties={
+            "symbol": types.Schema(type=types.Type.STRING),
+            "summary": types.Schema(type=types.Type.STRING),
+            "stance": types.Schema(type=types.Type.STRING, enum=list(STANCES)),
+            "defense": types.Schema(type=types.Type.STRING)
+        },
+        required=["symbol", "summary", "stance", "defense"]
+    )
+)
+
+# Calls the model, recording call latency and token usage
+def generate_content(contents: str, config: types.GenerateContentConfig | None = None, model: str = MODEL):
+    with provider_slot("gemini"), telemetry.span("provider.gemini", model=model):
+        response = get_credentials("client").models.generate_content(model=model, contents=contents, config=config)
+    telemetry.increment("provider_calls", provider="gemini", model=model)
+    usage = response.usage_metadata
+    if usage is not None:
+        telemetry.increment("model_prompt_tokens", usage.prompt_token_count or 0, model=model)
+        telemetry.increment("model_output_tokens", usage.candidates_token_count or 0, model=model)
+    return response
+
+# Gets stock price from the quote cache, fetching from finnhub when it is stale
+def get_stock_price(symbol: str) -> tuple[bool, dict | str]:
+    return get_quote(symbol)
+
+# Keeps the most relevant distinct articles within the prompt budget, returns them with their sources
+def filter_articles(symbol: str, name: str | None, articles: list) -> tuple[list, list]:
+    return select_articles(articles, symbol, name)
+
+# Checks that an analysis has the expected fields and a known stance
+def validate_analysis(analysis) -> bool:
+    return (
+        isinstance(analysis, dict)
+        and isinstance(analysis.get("summary"), str)
+        and isinstance(analysis.get("defense"), str)
+        and analysis.get("stance") in STANCES
+    )
+
+# Summarizes one symbol's articles and picks a stance
+def analyze_articles(symbol: str, articles: list) -> tuple[bool, dict | str]:
+    cache_key = cache.make_key(ANALYSIS_TEMPLATE, MODEL, articles, symbol)
+    cached_analysis = cache.get(cache_key)
+    if cached_analysis is not None:
+        return True, cached_analysis
+    response = generate_content(
+        contents=f"Review the following list of articles which mention {symbol} and write a concise 100-150 word summary of all the articles combined without mentioning 'the articles'. Also choose one of the following stances (bearish, bullish, neutral) and defend it. Return the response in a structured json output which matches the following: {{ summary: __________, stance: ______________, defense: ______________ }}. Articles: {articles}",
+    )
+    response = response.text
+    try:
+        parsed_response = json.loads(response[response.index("{"): response.index("}")+1])
+    except ValueError:
+        return False, f"Unparseable analysis for {symbol}"
+    if isinstance(parsed_response.get("stance"), str):
+        parsed_response["stance"] = parsed_response["stance"].lower()
+    if not validate_analysis(parsed_response):
+        return False, f"Invalid analysis for {symbol}"
+    cache.put(cache_key, parsed_response)
+    return True, parsed_response
+
+# Summarizes several symbols' articles in one structured-output call
+def analyze_articles_batch(articles_by_symbol: dict[str, list]) -> dict[str, tuple[bool, dict | str]]:
+    results = {}
+
+    # Reuses cached analyses for symbols whose articles have not changed
+    cache_keys = {symbol: cache.make_key(ANALYSIS_TEMPLATE, MODEL, articles, symbol) for symbol, articles in articles_by_symbol.items()}
+    for symbol, cache_key in cache_keys.items():
+        cached_analysis = cache.get(cache_key)
+        if cached_analysis is not None:
+            results[symbol] = (True, cached_analysis)
+    uncached = {symbol: articles for symbol, articles in articles_by_symbol.items() if symbol not in results}
+    if len(uncached) == 0:
+        return results
+
+    symbol_articles = "\n".join(f"{symbol}: {articles}" for symbol, articles in uncached.items())
+
+    # Provider errors (quota, throttling, transport) fail the batch's symbols, which the scheduler retries next run
+    try:
+        response = generate_content(
+            contents=f"For each stock symbol below, review the list of articles which mention it and write a concise 100-150 word summary of all its articles combined without mentioning 'the articles'. Also choose one of the following stances (bearish, bullish, neutral) for each symbol and defend it. Return one entry per symbol. Articles by symbol:\n{symbol_articles}",
+            config=types.GenerateContentConfig(
+                response_mime_type="application/json",
+                response_schema=BATCH_ANALYSIS_SCHEMA
             )
-            response = response.text
-            parsed_response = json.loads(response[response.index("{"): response.index("}")+1])
-            parsed_response["sources"] = sources
+        )
+    except Exception as e:
+        log(f"Batched analysis failed: {type(e).__name__}: {e}")
+        for symbol in uncached:
+            results[symbol] = (False, f"{type(e).__name__}: {e}")
+        return results
+    try:
+        analyses = json.loads(response.text)
+    except (TypeError, ValueError) as e:
+        log(f"Unparseable batched analysis: {e}")
+        analyses = []
+    for analysis in analyses if isinstance(analyses, list) else []:
+        if validate_analysis(analysis) and analysis.get("symbol") in uncached:
+            symbol = analysis.pop("symbol")
+            cache.put(cache_keys[symbol], analysis)
+            results[symbol] = (True, analysis)
 
-            # Gets stock price at time
-            status, stock_price_res = get_stock_price()
-            if status == True:
-                parsed_response["price"] = stock_price_res
-                return True, parsed_response
-            else:
-                return False, stock_price_res
-        return False, "Insufficient number of relevant articles"
+    # Falls back to single-symbol calls for symbols the response left out or answered invalidly, stopping at the first provider error
+    error = None
+    for symbol, articles in uncached.items():
+        if symbol in results:
+            continue
+        if error is not None:
+            results[symbol] = (False, error)
+            continue
+        try:
+            results[symbol] = analyze_articles(symbol, articles)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            results[symbol] = (False, error)
+    return results
 
-    # Returns relevant data
-    status, news_articles_res = get_news_elsewhere()
+# Adds sources and price at time of analysis to a successful analysis
+def complete_analysis(symbol: str, analysis: dict, sources: list) -> tuple[bool, dict | str]:
+    analysis["sources"] = sources
+    status, stock_price_res = get_stock_price(symbol)
     if status == True:
-        return analyze_news(articles=news_articles_res)
-    else:
-        return False, news_articles_res
\ No newline at end of file
+        analysis["price"] = stock_price_res
+        return True, analysis
+    return False, stock_price_res
+
+# Gets updates for many stocks, analyzing their news in batched model calls
+# Returns results by symbol and the news cursors to commit with each symbol's results
+def get_stock_updates_batch(stocks: list[tuple[str, str]]) -> tuple[dict[str, tuple[bool, dict | str]], dict[str, tuple[dict, list]]]:
+    results = {}
+
+    # Fetches news for every symbol with batched searches and filters it
+    with telemetry.span("news_stage", symbols=len(stocks)):
+        news, cursors = get_new_articles_batch(stocks)
+    names = dict(stocks)
+    relevant = {}
+    for symbol, (status, articles) in news.items():
+        if status == False:
+            results[symbol] = (False, articles)
+            continue
+        parsed_articles, sources = filter_articles(symbol, names.get(symbol), articles)
+        if len(articles) == 0:
+            results[symbol] = (False, "No new articles")
+        elif len(parsed_articles) == 0:
+            results[symbol] = (False, "Insufficient number of relevant articles")
+        else:
+            relevant[symbol] = (parsed_articles, sources)
+
+    # Analyzes relevant news in batches, then attaches sources and prices
+    symbols = list(relevant)
+    batches = [symbols[i:i + ANALYSIS_BATCH_SIZE] for i in range(0, len(symbols), ANALYSIS_BATCH_SIZE)]
+    with telemetry.span("analysis_stage", symbols=len(symbols), batches=len(batches)):
+        analyses, failed = run_concurrently(
+            items=batches,
+            job=lambda batch: (True, analyze_articles_batch({symbol: relevant[symbol][0] for symbol in batch})),
+            key=lambda batch: ",".join(batch)
+        )
+    analyzed = {}
+    for batch_key, res in failed:
+        for symbol in batch_key.split(","):
+            results[symbol] = (False, res)
+    for _, batch_results in analyses:
+        for symbol, (status, res) in batch_results.items():
+            if status == True:
+                analyzed[symbol] = res
+            else:
+                results[symbol] = (False, res)
+    # Refreshes stale quotes together so attaching prices reads memory
+    with telemetry.span("quote_stage", symbols=len(analyzed)):
+        refresh_quotes(analyzed)
+        for symbol, analysis in analyzed.items():
+            try:
+                results[symbol] = complete_analysis(symbol, analysis, relevant[symbol][1])
+            except Exception as e:
+                results[symbol] = (False, f"{type(e).__name__}: {e}")
+    return results, cursors
@@ -1,11 +1,11 @@
 # LIST OF COMMON HELPER FUNCTIONS FOR ALL FUNCTIONS
 
 # Dependencies
-import requests
-from google import genai
 import os
+import threading
 from datetime import datetime, timezone, timedelta
 from dotenv import load_dotenv
+import transport
 
 # Load environment variables
 load_dotenv()
@@ -22,14 +22,21 @@ def get_timestamp(with_date=False, delta=1) -> str:
         return now.strftime("%Y-%m-%d")
     return now.strftime("%Y-%m-%dT%H")
 
-# Gets data from finnhub
-def get_data_finnhub(url: str, params: dict) -> tuple[bool, dict | str]:
-    response = requests.get(f"https://finnhub.io/{url}", params=params)
-    response_object = response.json()
-    if "message" in response_object:
+# Sends request through shared transport and parses provider response
+def send_request(provider: str, method: str, url: str, **kwargs) -> tuple[bool, dict | list | str]:
+    try:
+        response = transport.request(provider, method, url, **kwargs)
+        response_object = response.json()
+    except Exception as e:
+        return False, f"{provider} request failed: {type(e).__name__}: {e}"
+    if isinstance(response_object, dict) and "message" in response_object:
         return False, response_object["message"]
     else:
         return True, response_object
+
+# Gets data from finnhub
+def get_data_finnhub(url: str, params: dict) -> tuple[bool, dict | str]:
+    return send_request("finnhub", "GET", url, params=params)
     
 # Parses data for user creation
 def parse_data(key: str, response: dict):
@@ -37,27 +44,58 @@ def parse_data(key: str, response: dict):
         return response[key]
     return None
     
-# Returns cored creds
-def get_credentials(key: str) -> str:
-    client = genai.Client(api_key=os.getenv("GOOGLE_GENAI_API_KEY"))
-    news_api_key = os.getenv("NEWS_API_KEY")
-    news_extra_api_key = os.getenv("NEWS_EXTRA_API_KEY")
-    stocks_api_key = os.getenv("STOCKS_API_KEY")
-    market_api_keys = (os.getenv("MARKET_API_KEY"), os.getenv("MARKET_API_SECRET"))
-    market_api_keys_dev = (os.getenv("MARKET_API_KEY_DEV"), os.getenv("MARKET_API_SECRET_DEV"))
-    twitter_api_keys = (os.getenv("TWITTER_API_KEY"), os.getenv("TWITTER_API_SECRET"))
-    twitter_access_tokens = (os.getenv("TWITTER_ACCESS_TOKEN"), os.getenv("TWITTER_ACCESS_TOKEN_SECRET"))
-    creds = {
-        "client": client,
-        "news_api_key": news_api_key,
-        "news_extra_api_key": news_extra_api_key,
-        "stocks_api_key": stocks_api_key,
-        "market_api_keys": market_api_keys,
-        "market_api_keys_dev": market_api_keys_dev,
-        "twitter_api_keys": twitter_api_keys,
-        "twitter_access_tokens": twitter_access_tokens
+# Process-wide registry of credentials and SDK clients, built once per instance
+_credentials: dict = {}
+_credentials_lock = threading.Lock()
+
+# Reads raw credentials from the environment
+def _load_credentials() -> dict:
+    return {
+        "google_genai_api_key": os.getenv("GOOGLE_GENAI_API_KEY"),
+        "google_genai_base_url": os.getenv("GOOGLE_GENAI_BASE_URL"),
+        "news_api_key": os.getenv("NEWS_API_KEY"),
+        "news_extra_api_key": os.getenv("NEWS_EXTRA_API_KEY"),
+        "stocks_api_key": os.getenv("STOCKS_API_KEY"),
+        "market_api_keys": (os.getenv("MARKET_API_KEY"), os.getenv("MARKET_API_SECRET")),
+        "market_api_keys_dev": (os.getenv("MARKET_API_KEY_DEV"), os.getenv("MARKET_API_SECRET_DEV")),
+        "twitter_api_keys": (os.getenv("TWITTER_API_KEY"), os.getenv("TWITTER_API_SECRET")),
+        "twitter_access_tokens": (os.getenv("TWITTER_ACCESS_TOKEN"), os.getenv("TWITTER_ACCESS_TOKEN_SECRET"))
     }
-    return creds[key]
+
+# Builds the Gemini client, the SDK is imported here so functions that never call Gemini skip loading it
+def _make_genai_client(creds: dict):
+    from google import genai
+    return genai.Client(
+        api_key=creds["google_genai_api_key"],
+        http_options={"base_url": creds["google_genai_base_url"]} if creds["google_genai_base_url"] else None
+    )
+
+# Builds SDK clients from the raw credentials on first use
+_client_factories = {
+    "client": _make_genai_client
+}
+
+# Returns cored creds
+def get_credentials(key: str):
+    if key not in _credentials:
+        with _credentials_lock:
+            if key not in _credentials:
+                _credentials.update({k: v for k, v in _load_credentials().items() if k not in _credentials})
+                if key in _client_factories:
+                    _credentials[key] = _client_factories[key](_credentials)
+    return _credentials[key]
+
+# Drops cached credentials and clients so they are rebuilt on next use (e.g. after key rotation)
+def refresh_credentials(key: str | None = None, reload_env: bool = True) -> None:
+    with _credentials_lock:
+        if reload_env:
+            load_dotenv(override=True)
+        if key is None:
+            _credentials.clear()
+        else:
+            _credentials.pop(key, None)
+            if key in ("google_genai_api_key", "google_genai_base_url"):
+                _credentials.pop("client", None)
 
 # Gets data from alpaca
 def get_data_alpaca(url: str) -> tuple[bool, dict | str]:
@@ -66,12 +104,7 @@ def get_data_alpaca(url: str) -> tuple[bool, dict | str]:
         "APCA-API-KEY-ID": get_credentials("market_api_keys")[0],
         "APCA-API-SECRET-KEY": get_credentials("market_api_keys")[1]
     }
-    response = requests.get(f"https://paper-api.alpaca.markets/{url}", headers=headers)
-    response_object = response.json()
-    if "message" in response_object:
-        return False, response_object["message"]
-    else:
-        return True, response_object
+    return send_request("alpaca", "GET", url, headers=headers)
     
 # Delete data from Alpaca
 def del_data_alpaca(url: str) -> tuple[bool, dict | str]:
@@ -80,12 +113,7 @@ def del_data_alpaca(url: str) -> tuple[bool, dict | str]:
         "APCA-API-KEY-ID": get_credentials("market_api_keys")[0],
         "APCA-API-SECRET-KEY": get_credentials("market_api_keys")[1]
     }
-    response = requests.delete(f"https://paper-api.alpaca.markets/{url}", headers=headers)
-    response_object = response.json()
-    if "message" in response_object:
-        return False, response_object["message"]
-    else:
-        return True, response_object
+    return send_request("alpaca", "DELETE", url, headers=headers)
     
 # Posts data to alpaca
 def post_data_alpaca(url: str, payload: dict, dev=False) -> tuple[bool, dict | str]:
@@ -95,9 +123,4 @@ def post_data_alpaca(url: str, payload: dict, dev=False) -> tuple[bool, dict | s
         "APCA-API-KEY-ID": get_credentials("market_api_keys")[0] if not dev else get_credentials("market_api_keys_dev")[0],
         "APCA-API-SECRET-KEY": get_credentials("market_api_keys")[1] if not dev else get_credentials("market_api_keys_dev")[1]
     }
-    response = requests.post(f"https://paper-api.alpaca.markets/{url}", headers=headers, json=payload)
-    response_object = response.json()
-    if "message" in response_object:
-        return False, response_object["message"]
-    else:
-        return True, response_object
\ No newline at end of file
+    return send_request("alpaca", "POST", url, headers=headers, json=payload)
\ No newline at end of file
@@ -0,0 +1,35 @@
+# UPDATE HISTORY FOR INDEXED STOCKS
+
+# Dependencies
+import os
+import google.cloud.firestore
+from firebase_admin import firestore
+
+# Number of update ids kept on each stock document, newest first
+RECENT_UPDATES_LIMIT = int(os.getenv("RECENT_UPDATES_LIMIT", 24))
+
+# Prepends an update id to a stock's capped ring of recent update ids
+def push_recent_update(recent_updates: list | None, update_id: str) -> list:
+    return ([update_id] + list(recent_updates or []))[:RECENT_UPDATES_LIMIT]
+
+# Gets a page of a symbol's updates, newest first, returns updates and cursor for the next page
+def get_recent_updates(firestore_client: google.cloud.firestore.Client, symbol: str, limit: int = 20, cursor: str | None = None) -> tuple[list, str | None]:
+    limit = max(1, limit)
+    updates_ref = firestore_client.collection("updates")
+    query = (
+        updates_ref
+        .where(filter=firestore.FieldFilter("symbol", "==", symbol))
+        .order_by("timestamp", direction=firestore.Query.DESCENDING)
+        .limit(limit)
+    )
+    if cursor is not None:
+        cursor_doc = updates_ref.document(cursor).get()
+        if cursor_doc.exists:
+            query = query.start_after(cursor_doc)
+    updates = []
+    for doc in query.stream():
+        update = doc.to_dict()
+        update["id"] = doc.id
+        updates.append(update)
+    next_cursor = updates[-1]["id"] if len(updates) == limit else None
+    return updates, next_cursor
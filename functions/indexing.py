@@ -0,0 +1,122 @@
+# BULK STOCK INDEXING WITH PROFILE CACHING
+
+# Dependencies
+import os
+import csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone, timedelta
+from typing import Iterable, Iterator
+import google.cloud.firestore
+from firebase_admin import firestore
+from helper import get_data_finnhub, get_credentials
+from batch_writer import BatchWriter
+from workers import provider_slot, DEFAULT_WORKERS
+from transport import PROVIDERS
+import telemetry
+
+# Hours an indexed profile is trusted before bulk indexing fetches it again
+PROFILE_MAX_AGE_HOURS = float(os.getenv("PROFILE_MAX_AGE_HOURS", 7 * 24))
+MAX_BULK_SYMBOLS = int(os.getenv("MAX_BULK_SYMBOLS", 5000))
+
+# Timeout of the bulk indexing request, profiles fetched per request are capped to what the finnhub quota allows in it
+INDEX_TIMEOUT_SECONDS = 3600
+MAX_PROFILE_FETCHES = int(PROVIDERS["finnhub"]["rate"] / PROVIDERS["finnhub"]["period"] * INDEX_TIMEOUT_SECONDS * 0.8)
+
+# Column names recognized as the symbol column of a CSV with a header
+SYMBOL_COLUMNS = ("symbol", "ticker")
+
+# Parses symbols from CSV lines (a header with a symbol or ticker column, or symbols in the first column), deduplicated in order
+def parse_symbols(lines: Iterable[str]) -> list[str]:
+    symbols, column = {}, 0
+    for number, row in enumerate(csv.reader(lines)):
+        cells = [cell.strip() for cell in row]
+        if number == 0:
+            header = [cell.lower() for cell in cells]
+            matches = [index for index, cell in enumerate(header) if cell in SYMBOL_COLUMNS]
+            if len(matches) != 0:
+                column = matches[0]
+                continue
+        if column < len(cells) and cells[column]:
+            symbols[cells[column].upper()] = True
+    return list(symbols)
+
+# Builds the stock document fields from a Finnhub profile
+def profile_fields(info_object: dict) -> dict:
+    return {
+        "symbol": info_object["ticker"],
+        "name": info_object["name"],
+        "logo": info_object["logo"],
+        "industry": info_object["finnhubIndustry"],
+        "exchange": info_object["exchange"],
+        "market_cap": info_object["marketCapitalization"],
+        "timestamp": firestore.SERVER_TIMESTAMP
+    }
+
+# Gets a stock's profile from finnhub, returns the stock document fields
+def fetch_profile(symbol: str) -> tuple[bool, dict | str]:
+    params = {
+        "symbol": symbol,
+        "token": get_credentials("stocks_api_key"),
+    }
+    with provider_slot("finnhub"), telemetry.span("profile", symbol=symbol):
+        status, info_object = get_data_finnhub(url="api/v1/stock/profile2", params=params)
+    if status == False:
+        return False, info_object
+    if not isinstance(info_object, dict) or "error" in info_object:
+        return False, str(info_object.get("error") if isinstance(info_object, dict) else info_object)
+    if not info_object:
+        return False, "Unknown symbol"
+    try:
+        return True, profile_fields(info_object)
+    except KeyError as e:
+        return False, f"Profile is missing {e}"
+
+# Returns the symbols whose indexed profile is newer than max_age_hours
+def get_fresh_symbols(firestore_client: google.cloud.firestore.Client, symbols: list[str], max_age_hours: float) -> set[str]:
+    stocks_ref = firestore_client.collection("stocks")
+    fresh_after = datetime.now(timezone.utc) - timedelta(hours=max_age_hours)
+    fresh = set()
+    for i in range(0, len(symbols), 100):
+        refs = [stocks_ref.document(symbol.lower()) for symbol in symbols[i:i + 100]]
+        for stock in firestore_client.get_all(refs, field_paths=["timestamp"]):
+            indexed_at = stock.get("timestamp") if stock.exists else None
+            if indexed_at is not None and indexed_at > fresh_after:
+                fresh.add(stock.id.upper())
+    return fresh
+
+# Indexes many stocks, yielding per-symbol progress as profiles arrive and a summary once every write is committed
+@telemetry.metered("index_stocks")
+def index_symbols(firestore_client: google.cloud.firestore.Client, symbols: list[str], max_age_hours: float = PROFILE_MAX_AGE_HOURS) -> Iterator[dict]:
+    counts = {"indexed": 0, "skipped": 0, "failed": 0, "deferred": 0}
+    fresh = get_fresh_symbols(firestore_client, symbols, max_age_hours) if max_age_hours > 0 else set()
+    for symbol in symbols:
+        if symbol in fresh:
+            counts["skipped"] += 1
+            yield {"symbol": symbol, "status": "skipped"}
+
+    # Defers profiles past what fits in the request timeout, they are indexed by sending them again
+    stale = [symbol for symbol in symbols if symbol not in fresh]
+    deferred, stale = stale[MAX_PROFILE_FETCHES:], stale[:MAX_PROFILE_FETCHES]
+    for symbol in deferred:
+        counts["deferred"] += 1
+        yield {"symbol": symbol, "status": "deferred"}
+
+    # Fetches stale profiles concurrently, the finnhub rate limiter paces the requests
+    stocks_ref = firestore_client.collection("stocks")
+    with telemetry.span("bulk_index", symbols=len(stale)), BatchWriter(firestore_client) as writer:
+        with ThreadPoolExecutor(max_workers=DEFAULT_WORKERS) as executor:
+            futures = {executor.submit(telemetry.carry(fetch_profile), symbol): symbol for symbol in stale}
+            for future in as_completed(futures):
+                symbol = futures[future]
+                try:
+                    status, res = future.result()
+                except Exception as e:
+                    status, res = False, f"{type(e).__name__}: {e}"
+                if status == True:
+                    writer.set(stocks_ref.document(symbol.lower()), res, merge=True)
+                    counts["indexed"] += 1
+                    yield {"symbol": symbol, "status": "indexed"}
+                else:
+                    counts["failed"] += 1
+                    yield {"symbol": symbol, "status": "failed", "error": str(res)}
+    yield {"status": "done", **counts, "committed": writer.committed}
@@ -0,0 +1,289 @@
+# INCREMENTAL NEWS INGESTION WITH PER-SYMBOL CURSORS
+
+# Dependencies
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from firebase_admin import firestore
+from helper import get_credentials, send_request, log
+import telemetry
+from workers import provider_slot, run_concurrently
+
+# Ingestion settings
+NEWS_MAX_PAGES = int(os.getenv("NEWS_MAX_PAGES", 5))
+NEWS_LOOKBACK_HOURS = int(os.getenv("NEWS_LOOKBACK_HOURS", 1))
+SEEN_TTL_SECONDS = int(os.getenv("NEWS_SEEN_TTL_SECONDS", 48 * 60 * 60))
+SEEN_MAX_ENTRIES = int(os.getenv("NEWS_SEEN_MAX_ENTRIES", 100000))
+CURSOR_SEEN_LIMIT = int(os.getenv("NEWS_CURSOR_SEEN_LIMIT", 200))
+CURSOR_MAX_GAPS = int(os.getenv("NEWS_CURSOR_MAX_GAPS", 4))
+CURSORS_USE_FIRESTORE = os.getenv("NEWS_CURSORS_FIRESTORE", "true").lower() == "true"
+CURSOR_COLLECTION = "news_cursors"
+NEWS_QUERY_MAX_LENGTH = int(os.getenv("NEWS_QUERY_MAX_LENGTH", 500))
+NEWS_BATCH_MAX_PAGES = int(os.getenv("NEWS_BATCH_MAX_PAGES", 10))
+NEWS_PAGES_PER_SYMBOL = int(os.getenv("NEWS_PAGES_PER_SYMBOL", 1))
+SHORT_TICKER_LENGTH = 2
+
+# Trailing words of a company name that headlines usually leave out
+CORPORATE_SUFFIXES = {
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited", "plc",
+    "holdings", "holding", "llc", "lp", "sa", "ag", "nv", "se"
+}
+
+# Bounded set of article ids that forgets entries after a TTL
+class SeenIndex:
+
+    def __init__(self, ttl: int = SEEN_TTL_SECONDS, max_entries: int = SEEN_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries: OrderedDict[str, float] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            expires_at = self.entries.get(key)
+            if expires_at is None:
+                return False
+            if expires_at < time.time():
+                del self.entries[key]
+                return False
+            return True
+
+    def add(self, key: str) -> None:
+        with self.lock:
+            self.entries[key] = time.time() + self.ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+_seen = SeenIndex()
+_cursors: dict[str, dict] = {}
+_cursors_lock = threading.Lock()
+
+# Stable id of an article
+def article_id(article: dict) -> str:
+    return str(article.get("uuid") or article.get("url"))
+
+# New cursor for a symbol with nothing processed yet
+def initial_cursor() -> dict:
+    start = datetime.now(timezone.utc) - timedelta(hours=NEWS_LOOKBACK_HOURS)
+    return {"published_after": start.strftime("%Y-%m-%dT%H:%M:%S"), "seen": [], "gaps": []}
+
+# Gets the cursors of many symbols: newest published_at processed, ids seen at that point and windows not fetched yet
+# Read from Firestore on every run, since other functions and instances move the same cursors, memory only serves when it is off
+def load_cursors(symbols: list[str]) -> dict[str, dict]:
+    cursors = {}
+    if CURSORS_USE_FIRESTORE:
+        collection = firestore.client().collection(CURSOR_COLLECTION)
+        for doc in firestore.client().get_all([collection.document(symbol) for symbol in symbols]):
+            if doc.exists:
+                cursors[doc.id] = doc.to_dict()
+    else:
+        with _cursors_lock:
+            cursors = {symbol: _cursors[symbol] for symbol in symbols if symbol in _cursors}
+    for symbol in symbols:
+        cursors.setdefault(symbol, initial_cursor())
+    return cursors
+
+# Write storing a symbol's cursor, added to the commit that records what its articles produced
+def cursor_write(symbol: str, cursor: dict) -> tuple | None:
+    if not CURSORS_USE_FIRESTORE:
+        return None
+    return ("set", firestore.client().collection(CURSOR_COLLECTION).document(symbol), {**cursor, "timestamp": firestore.SERVER_TIMESTAMP})
+
+# Moves a symbol's cursor in memory and marks its articles seen, once the cursor's write is committed
+def remember_cursor(symbol: str, cursor: dict, articles: list) -> None:
+    with _cursors_lock:
+        _cursors[symbol] = cursor
+    for article in articles:
+        _seen.add(f"{symbol}:{article_id(article)}")
+
+# Pages through thenewsapi results matching search published in a window, newest first
+# Returns the articles and the oldest published_at fetched when the page cap cut the results short, else None
+def fetch_articles(search: str, published_after: str, published_before: str | None = None, max_pages: int = NEWS_MAX_PAGES) -> tuple[list, str | None]:
+    articles = []
+    for page in range(1, max_pages + 1):
+        params = {
+            "api_token": get_credentials("news_api_key"),
+            "search": search,
+            "search_fields": "title,description,keywords,main_text",
+            "language": "en",
+            "published_after": published_after,
+            "categories": "business",
+            "sort": "published_at",
+            "page": page
+        }
+        if published_before is not None:
+            params["published_before"] = published_before
+        status, response_object = send_request("news", "GET", "v1/news/all", params=params)
+        if status == False or "data" not in response_object:
+            raise RuntimeError(f"Failed to retrieve articles: {response_object}")
+        telemetry.increment("news_pages")
+        articles.extend(response_object["data"])
+        meta = response_object.get("meta", {})
+        if meta.get("returned", 0) == 0 or page * max(meta.get("limit", 1), 1) >= meta.get("found", 0):
+            return articles, None
+    telemetry.increment("news_truncated")
+    return articles, min((str(article.get("published_at") or "")[:19] for article in articles), default=None)
+
+# Keeps articles a symbol has not processed yet, returns them and the symbol's advanced cursor, nothing is marked seen until the cursor is committed
+# Articles older than a truncated fetch reached are kept as a gap in the cursor and fetched on a later run
+def accept_articles(symbol: str, cursor: dict, articles: list, oldest: str | None = None, gap_articles: list | None = None, gap_oldest: str | None = None) -> tuple[list, dict]:
+    seen_at_cursor = set(cursor.get("seen", []))
+    newest = cursor["published_after"]
+    gaps = [dict(gap) for gap in cursor.get("gaps", [])]
+    new_articles, newest_ids, accepted = [], list(cursor.get("seen", [])), set()
+
+    # Articles newer than the cursor
+    for article in articles:
+        key = f"{symbol}:{article_id(article)}"
+        published_at = (article.get("published_at") or "")[:19]
+        if key in _seen or key in accepted or article_id(article) in seen_at_cursor or (published_at and published_at < cursor["published_after"]):
+            telemetry.increment("news_duplicates")
+            continue
+        accepted.add(key)
+        new_articles.append(article)
+        if published_at > newest:
+            newest, newest_ids = published_at, [article_id(article)]
+        elif published_at == newest:
+            newest_ids.append(article_id(article))
+
+    # Articles of the newest gap, which shrinks from the top until a fetch reaches its start
+    if gap_articles is not None and len(gaps) != 0:
+        gap = gaps[0]
+        for article in gap_articles:
+            key = f"{symbol}:{article_id(article)}"
+            published_at = (article.get("published_at") or "")[:19]
+            if key in _seen or key in accepted or not (gap["after"] < published_at < gap["before"]):
+                continue
+            accepted.add(key)
+            new_articles.append(article)
+        if gap_oldest is None or gap_oldest <= gap["after"]:
+            gaps.pop(0)
+        else:
+            gap["before"] = min(gap["before"], gap_oldest)
+    if oldest is not None and oldest > cursor["published_after"]:
+        gaps.insert(0, {"after": cursor["published_after"], "before": oldest})
+    if len(gaps) > CURSOR_MAX_GAPS:
+        log(f"Dropping {len(gaps) - CURSOR_MAX_GAPS} unfetched news windows of {symbol}")
+        gaps = gaps[:CURSOR_MAX_GAPS]
+    return new_articles, {"published_after": newest, "seen": newest_ids[-CURSOR_SEEN_LIMIT:], "gaps": gaps}
+
+# Packs stocks into OR-combined searches no longer than NEWS_QUERY_MAX_LENGTH
+def build_query_batches(stocks: list[tuple[str, str]], max_length: int = NEWS_QUERY_MAX_LENGTH) -> list[tuple[str, list]]:
+    batches, terms, batch = [], [], []
+    for symbol, name in stocks:
+        term = f"({symbol} | {core_name(name)})" if name else f"({symbol})"
+        if len(batch) != 0 and len(" | ".join(terms + [term])) > max_length:
+            batches.append((" | ".join(terms), batch))
+            terms, batch = [], []
+        terms.append(term)
+        batch.append((symbol, name))
+    if len(batch) != 0:
+        batches.append((" | ".join(terms), batch))
+    return batches
+
+# Words of a company name in lower case, without punctuation
+def name_words(name: str) -> list[str]:
+    return re.findall(r"[^\W_]+", name.lower())
+
+# Company name as headlines write it, without punctuation and corporate suffixes ("Ford Motor Co" -> "Ford Motor")
+def core_name(name: str) -> str:
+    words = re.findall(r"[^\W_]+", name)
+    while len(words) > 1 and words[-1].lower() in CORPORATE_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+# Compiles one alternation matching any ticker (case-sensitive) or core company name (case-insensitive, any punctuation between words)
+# Tickers of SHORT_TICKER_LENGTH letters or fewer ("A", "GE") only match as $GE, (GE) or NYSE: GE, since they are also ordinary words
+def compile_matcher(stocks: list[tuple[str, str]]) -> tuple[re.Pattern, dict[str, set]]:
+    owners: dict[str, set] = {}
+    names = set()
+    for symbol, name in stocks:
+        owners.setdefault(symbol, set()).add(symbol)
+        words = name_words(core_name(name)) if name else []
+        if len(words) != 0:
+            owners.setdefault(" ".join(words), set()).add(symbol)
+            names.add(tuple(words))
+    symbols = sorted({symbol for symbol, _ in stocks}, key=len, reverse=True)
+    name_patterns = [r"\W+".join(re.escape(word) for word in words) for words in sorted(names, key=lambda words: len(" ".join(words)), reverse=True)]
+    plain = [re.escape(symbol) for symbol in symbols if len(symbol) > SHORT_TICKER_LENGTH] + [f"(?i:{pattern})" for pattern in name_patterns]
+    short = [re.escape(symbol) for symbol in symbols if len(symbol) <= SHORT_TICKER_LENGTH]
+    patterns = []
+    if len(plain) != 0:
+        patterns.append(r"(?<![\w$])\$?(" + "|".join(plain) + r")(?!\w)")
+    if len(short) != 0:
+        alternation = "|".join(short)
+        patterns.append(r"\$(" + alternation + r")(?!\w)")
+        patterns.append(r"\((" + alternation + r")\)")
+        patterns.append(r"\b(?:NYSE|NASDAQ|Nasdaq|AMEX|NYSEAMERICAN|OTC)\s*:\s*(" + alternation + r")(?!\w)")
+    return re.compile("|".join(patterns) or r"(?!)"), owners
+
+# Routes each article to the symbols it mentions in its title, description or keywords
+# A search for a single symbol gives it every article, since the provider already matched them to it
+def route_articles(articles: list, matcher: re.Pattern, owners: dict[str, set], batch: list[tuple[str, str]] | None = None) -> dict[str, list]:
+    if batch is not None and len(batch) == 1:
+        return {batch[0][0]: list(articles)}
+    routed: dict[str, list] = {}
+    for article in articles:
+        text = " ".join(str(article.get(field) or "") for field in ("title", "description", "keywords"))
+        symbols = set()
+        for match in matcher.finditer(text):
+            term = next(group for group in match.groups() if group is not None)
+            symbols |= owners.get(term, set()) | owners.get(" ".join(name_words(term)), set())
+        for symbol in symbols:
+            routed.setdefault(symbol, []).append(article)
+    return routed
+
+# Gets unprocessed articles for many stocks with one paged search per batch of stocks
+# Returns results by symbol and the advanced cursors, which callers commit with cursor_write once the articles are recorded
+def get_new_articles_batch(stocks: list[tuple[str, str]]) -> tuple[dict[str, tuple[bool, list | str]], dict[str, tuple[dict, list]]]:
+
+    # Fetches and routes one batch of stocks, along with the newest unfetched window of any of them
+    def fetch_batch(query_batch: tuple[str, list]) -> tuple[bool, dict]:
+        search, batch = query_batch
+        cursors = load_cursors([symbol for symbol, _ in batch])
+        matcher = compile_matcher(batch)
+        published_after = min(cursor["published_after"] for cursor in cursors.values())
+        max_pages = max(NEWS_BATCH_MAX_PAGES, NEWS_PAGES_PER_SYMBOL * len(batch))
+        with provider_slot("news"), telemetry.span("news_fetch_batch", symbols=len(batch)):
+            articles, oldest = fetch_articles(search, published_after, max_pages=max_pages)
+        routed = route_articles(articles, *matcher, batch)
+        gaps = [cursor["gaps"][0] for cursor in cursors.values() if cursor.get("gaps")]
+        routed_gaps, gap_oldest = None, None
+        if len(gaps) != 0:
+            with provider_slot("news"), telemetry.span("news_fetch_gap", symbols=len(gaps)):
+                gap_articles, gap_oldest = fetch_articles(search, min(gap["after"] for gap in gaps), max(gap["before"] for gap in gaps), max_pages=max_pages)
+            routed_gaps = route_articles(gap_articles, *matcher, batch)
+        batch_results = {}
+        for symbol, _ in batch:
+            new_articles, new_cursor = accept_articles(
+                symbol, cursors[symbol], routed.get(symbol, []), oldest,
+                routed_gaps.get(symbol, []) if routed_gaps is not None else None, gap_oldest
+            )
+            telemetry.increment("news_new_articles", len(new_articles))
+            batch_results[symbol] = (True, new_articles, new_cursor if new_cursor != cursors[symbol] else None)
+        return True, batch_results
+
+    results, cursors = {}, {}
+    query_batches = build_query_batches(stocks)
+    fetched, failed = run_concurrently(items=query_batches, job=fetch_batch, key=lambda query_batch: query_batch[0])
+    for _, batch_results in fetched:
+        for symbol, (status, articles, cursor) in batch_results.items():
+            results[symbol] = (status, articles)
+            if cursor is not None:
+                cursors[symbol] = (cursor, articles)
+    batches_by_search = dict(query_batches)
+    for search, res in failed:
+        for symbol, _ in batches_by_search[search]:
+            results[symbol] = (False, res)
+    return results, cursors
+
+# Forgets every cursor and seen article held in memory
+def clear() -> None:
+    with _cursors_lock:
+        _cursors.clear()
+    with _seen.lock:
+        _seen.entries.clear()
@@ -0,0 +1,174 @@
+# NYSE TRADING CALENDAR COMPUTED LOCALLY
+
+# Dependencies
+import threading
+import time
+from datetime import date, datetime, time as clock, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+from firebase_admin import firestore
+from helper import get_credentials, get_data_finnhub, log
+
+MARKET_TIMEZONE = ZoneInfo("America/New_York")
+REGULAR_OPEN = clock(9, 30)
+REGULAR_CLOSE = clock(16, 0)
+EARLY_CLOSE = clock(13, 0)
+REFRESH_INTERVAL_SECONDS = 24 * 60 * 60
+
+# Document holding the Finnhub corrections, written daily by the refresh schedule
+CALENDAR_COLLECTION = "market_calendar"
+CALENDAR_DOCUMENT = "US"
+
+# Holiday and early-close corrections reported by Finnhub, date -> (open, close) or None when closed
+_overrides: dict[date, tuple[clock, clock] | None] = {}
+_overrides_lock = threading.Lock()
+_loaded_at = 0.0
+
+# Gets the nth weekday (0 = Monday) of a month, negative n counts from the end
+def nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = date(year, month + 1, 1) - timedelta(days=1) if month < 12 else date(year, 12, 31)
+    return last - timedelta(days=(last.weekday() - weekday) % 7 + 7 * (-n - 1))
+
+# Gets Easter Sunday (anonymous Gregorian algorithm)
+def easter(year: int) -> date:
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+# Moves a fixed-date holiday off the weekend, Saturday to Friday and Sunday to Monday
+def observed(day: date) -> date:
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+# Computes full-day market holidays for a year
+@lru_cache(maxsize=8)
+def get_holidays(year: int) -> frozenset[date]:
+    holidays = {
+        nth_weekday(year, 1, 0, 3),  # Martin Luther King Jr. Day
+        nth_weekday(year, 2, 0, 3),  # Washington's Birthday
+        easter(year) - timedelta(days=2),  # Good Friday
+        nth_weekday(year, 5, 0, -1),  # Memorial Day
+        observed(date(year, 7, 4)),  # Independence Day
+        nth_weekday(year, 9, 0, 1),  # Labor Day
+        nth_weekday(year, 11, 3, 4),  # Thanksgiving Day
+        observed(date(year, 12, 25))  # Christmas Day
+    }
+    # New Year's Day falling on a Saturday is not observed on the prior Friday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays.add(observed(new_year))
+    if year >= 2022:
+        holidays.add(observed(date(year, 6, 19)))  # Juneteenth
+    return frozenset(holidays)
+
+# Computes 1:00 PM early closes for a year
+@lru_cache(maxsize=8)
+def get_early_closes(year: int) -> frozenset[date]:
+    holidays = get_holidays(year)
+    candidates = {
+        date(year, 7, 3),  # Day before Independence Day
+        nth_weekday(year, 11, 3, 4) + timedelta(days=1),  # Day after Thanksgiving
+        date(year, 12, 24)  # Christmas Eve
+    }
+    return frozenset(day for day in candidates if day.weekday() < 5 and day not in holidays)
+
+# Gets opening and closing times of a day's session in market time, None if the market is closed
+def get_session(day: date) -> tuple[datetime, datetime] | None:
+    if day in _overrides:
+        hours = _overrides[day]
+    elif day.weekday() >= 5 or day in get_holidays(day.year):
+        hours = None
+    elif day in get_early_closes(day.year):
+        hours = (REGULAR_OPEN, EARLY_CLOSE)
+    else:
+        hours = (REGULAR_OPEN, REGULAR_CLOSE)
+    if hours is None:
+        return None
+    return datetime.combine(day, hours[0], MARKET_TIMEZONE), datetime.combine(day, hours[1], MARKET_TIMEZONE)
+
+# Checks whether the regular session is open at a time (now by default)
+def is_market_open(at: datetime | None = None) -> bool:
+    at = (at or datetime.now(timezone.utc)).astimezone(MARKET_TIMEZONE)
+    session = get_session(at.date())
+    return session is not None and session[0] <= at < session[1]
+
+# Checks whether a day has a trading session
+def is_trading_day(day: date) -> bool:
+    return get_session(day) is not None
+
+# Gets the next session opening at or after a time
+def next_session_open(at: datetime | None = None) -> datetime:
+    at = (at or datetime.now(timezone.utc)).astimezone(MARKET_TIMEZONE)
+    day = at.date()
+    while True:
+        session = get_session(day)
+        if session is not None and session[1] > at:
+            return max(session[0], at)
+        day += timedelta(days=1)
+
+# Applies holiday corrections given as {"YYYY-MM-DD": "HH:MM-HH:MM"}, an empty trading hour means closed all day
+def apply_overrides(overrides: dict[str, str]) -> None:
+    with _overrides_lock:
+        for day, trading_hour in overrides.items():
+            try:
+                if trading_hour == "":
+                    _overrides[date.fromisoformat(day)] = None
+                else:
+                    opens, closes = trading_hour.split("-")
+                    _overrides[date.fromisoformat(day)] = (clock.fromisoformat(opens), clock.fromisoformat(closes))
+            except ValueError:
+                log(f"Skipping malformed market holiday: {day} {trading_hour}")
+
+# Loads holiday corrections stored by refresh_holidays, at most once per REFRESH_INTERVAL_SECONDS per instance
+# Never calls Finnhub, the local rules answer alone when the stored corrections cannot be read
+def load_holidays(force: bool = False) -> bool:
+    global _loaded_at
+    if not force and time.time() - _loaded_at < REFRESH_INTERVAL_SECONDS:
+        return False
+    _loaded_at = time.time()
+    try:
+        doc = firestore.client().collection(CALENDAR_COLLECTION).document(CALENDAR_DOCUMENT).get()
+    except Exception as e:
+        log(f"Failed to load market holidays: {e}")
+        return False
+    if not doc.exists:
+        return False
+    apply_overrides(doc.to_dict().get("overrides", {}))
+    return True
+
+# Pulls holiday corrections from Finnhub and stores them for load_holidays, run from a daily schedule
+def refresh_holidays() -> bool:
+    params = {
+        "exchange": "US",
+        "token": get_credentials("stocks_api_key"),
+    }
+    status, holidays_res = get_data_finnhub(url="api/v1/stock/market-holiday", params=params)
+    if status == False:
+        log(f"Failed to refresh market holidays: {holidays_res}")
+        return False
+    overrides = {}
+    for holiday in holidays_res.get("data", []):
+        if "atDate" not in holiday:
+            log(f"Skipping malformed market holiday: {holiday}")
+            continue
+        overrides[holiday["atDate"]] = holiday.get("tradingHour") or ""
+    apply_overrides(overrides)
+    firestore.client().collection(CALENDAR_COLLECTION).document(CALENDAR_DOCUMENT).set({
+        "overrides": overrides,
+        "fetched_at": firestore.SERVER_TIMESTAMP
+    })
+    return True
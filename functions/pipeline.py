@@ -0,0 +1,28 @@
+# UPDATE PIPELINE TRIGGERED BY NEW UPDATES
+
+# Dependencies, the trading and tweeting stages are imported on the first update
+from firebase_functions.firestore_fn import on_document_created, Event, DocumentSnapshot
+from firebase_functions import scheduler_fn
+from firebase_admin import firestore
+import google.cloud.firestore
+import google
+
+# Trades on and tweets about each new update in one invocation
+@on_document_created(document="updates/{updateId}")
+def process_update(event: Event[DocumentSnapshot]) -> None:
+
+    # Makes update readable
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    update = event.data.to_dict()
+
+    # Runs every stage and records their results together
+    from dispatch import run_pipeline
+    run_pipeline(firestore_client, event.data.id, update)
+
+# Reruns stages that failed or whose invocation crashed, Firestore triggers are not redelivered
+@scheduler_fn.on_schedule(schedule="*/10 * * * *", timeout_sec=540)
+def recover_update_stages(event: scheduler_fn.ScheduledEvent) -> None:
+    from dispatch import recover_updates
+    from helper import log
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    log(f"Recovered {recover_updates(firestore_client)} updates")
@@ -0,0 +1,150 @@
+# IN-MEMORY QUOTE CACHE FED BY BATCHED REFRESHES OR REPLAYED FINNHUB TRADE MESSAGES
+
+# Dependencies
+import os
+import json
+import math
+import time
+import threading
+from array import array
+from typing import Iterable
+from helper import get_data_finnhub, get_credentials
+from workers import provider_slot, run_concurrently
+import telemetry
+
+# Seconds a cached quote may be served before it is refreshed from Finnhub
+QUOTE_MAX_AGE_SECONDS = float(os.getenv("QUOTE_MAX_AGE_SECONDS", 60))
+
+# Slots of each symbol's row, timestamp is the provider's (seconds) and received_at is when this instance stored it
+FIELDS = ("last", "high", "low", "open", "prev_close", "timestamp", "received_at")
+_STRIDE = len(FIELDS)
+_LAST, _HIGH, _LOW, _OPEN, _PREV_CLOSE, _TIMESTAMP, _RECEIVED_AT = range(_STRIDE)
+
+# Fields a Finnhub quote must carry to be stored
+QUOTE_FIELDS = ("c", "h", "l", "o", "pc")
+
+# Quotes stored as fixed-width rows of one flat float array, indexed by symbol
+class QuoteStore:
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.values = array("d")
+        self.lock = threading.Lock()
+
+    def _row(self, symbol: str) -> int:
+        row = self.index.get(symbol)
+        if row is None:
+            row = len(self.index)
+            self.index[symbol] = row
+            self.values.extend([math.nan] * _STRIDE)
+        return row * _STRIDE
+
+    # Stores a full quote in Finnhub's quote shape (c, h, l, o, pc, t)
+    def put(self, symbol: str, quote: dict) -> None:
+        symbol = symbol.upper()
+        row = array("d", [
+            float(quote["c"]), float(quote["h"]), float(quote["l"]), float(quote["o"]),
+            float(quote["pc"]), float(quote.get("t") or time.time()), time.time()
+        ])
+        with self.lock:
+            offset = self._row(symbol)
+            self.values[offset:offset + _STRIDE] = row
+
+    # Applies a streamed trade to a quote seeded by a refresh, returns False when the symbol has no quote yet
+    def apply_trade(self, symbol: str, price: float, timestamp: float) -> bool:
+        symbol = symbol.upper()
+        with self.lock:
+            row = self.index.get(symbol)
+            if row is None:
+                return False
+            offset = row * _STRIDE
+            if timestamp < self.values[offset + _TIMESTAMP]:
+                return True
+            self.values[offset + _LAST] = price
+            self.values[offset + _HIGH] = max(self.values[offset + _HIGH], price)
+            self.values[offset + _LOW] = min(self.values[offset + _LOW], price)
+            self.values[offset + _TIMESTAMP] = timestamp
+            self.values[offset + _RECEIVED_AT] = time.time()
+            return True
+
+    # Reads a quote in Finnhub's shape if it was stored within max_age seconds, change (d) and percent change (dp) are derived from c and pc
+    def get(self, symbol: str, max_age: float = QUOTE_MAX_AGE_SECONDS) -> dict | None:
+        symbol = symbol.upper()
+        with self.lock:
+            row = self.index.get(symbol)
+            if row is None:
+                return None
+            offset = row * _STRIDE
+            last, high, low, open_, prev_close, timestamp, received_at = self.values[offset:offset + _STRIDE]
+        if math.isnan(received_at) or time.time() - received_at > max_age:
+            return None
+        change = last - prev_close
+        return {
+            "c": last, "d": change, "dp": change / prev_close * 100 if prev_close else None,
+            "h": high, "l": low, "o": open_, "pc": prev_close, "t": int(timestamp)
+        }
+
+    def clear(self) -> None:
+        with self.lock:
+            self.index = {}
+            self.values = array("d")
+
+_store = QuoteStore()
+
+# Fetches one quote over REST and stores it
+def fetch_quote(symbol: str) -> tuple[bool, dict | str]:
+    params = {
+        "symbol": symbol,
+        "token": get_credentials("stocks_api_key"),
+    }
+    with provider_slot("finnhub"), telemetry.span("quote", symbol=symbol):
+        status, quote_res = get_data_finnhub(url="api/v1/quote", params=params)
+    if status == False:
+        return False, quote_res
+    if not isinstance(quote_res, dict) or "error" in quote_res:
+        return False, str(quote_res.get("error") if isinstance(quote_res, dict) else quote_res)
+    if any(quote_res.get(field) is None for field in QUOTE_FIELDS):
+        return False, f"Incomplete quote for {symbol}"
+    # Finnhub answers unknown symbols with an all-zero quote
+    if not quote_res["c"] and not quote_res.get("t"):
+        return False, f"No quote for {symbol}"
+    _store.put(symbol, quote_res)
+    return True, _store.get(symbol, math.inf)
+
+# Gets a symbol's quote from memory, fetching it only when it is missing or older than max_age
+def get_quote(symbol: str, max_age: float = QUOTE_MAX_AGE_SECONDS) -> tuple[bool, dict | str]:
+    quote = _store.get(symbol, max_age)
+    if quote is not None:
+        telemetry.increment("quote_cache_hits")
+        return True, quote
+    telemetry.increment("quote_cache_misses")
+    return fetch_quote(symbol)
+
+# Refreshes the quotes of many symbols concurrently, skipping those still fresh, returns symbols that failed
+def refresh_quotes(symbols: Iterable[str], max_age: float = QUOTE_MAX_AGE_SECONDS) -> dict[str, str]:
+    stale = [symbol for symbol in dict.fromkeys(symbols) if _store.get(symbol, max_age) is None]
+    if len(stale) == 0:
+        return {}
+    with telemetry.span("quote_refresh", symbols=len(stale)):
+        _, failed = run_concurrently(items=stale, job=fetch_quote)
+    return dict(failed)
+
+# Applies one Finnhub websocket message ({"type": "trade", "data": [{"s", "p", "t", ...}]}), returns trades applied
+def apply_message(message: str | dict) -> int:
+    if isinstance(message, str):
+        message = json.loads(message)
+    if message.get("type") != "trade":
+        return 0
+    applied = 0
+    for trade in message.get("data") or []:
+        if _store.apply_trade(trade["s"], float(trade["p"]), trade["t"] / 1000):
+            applied += 1
+    telemetry.increment("quote_stream_trades", applied)
+    return applied
+
+# Replays recorded websocket messages (one JSON message per line) into the cache, returns trades applied
+def replay(messages: Iterable[str | dict]) -> int:
+    return sum(apply_message(message) for message in messages if message)
+
+def clear() -> None:
+    _store.clear()
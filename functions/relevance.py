@@ -0,0 +1,100 @@
+# PRE-MODEL ARTICLE SCORING, DEDUPLICATION AND TRIMMING
+
+# Dependencies
+import os
+import re
+import random
+import zlib
+
+# Scoring and prompt budget settings
+MIN_PROVIDER_RELEVANCE = float(os.getenv("MIN_PROVIDER_RELEVANCE", 15))
+MAX_ARTICLES = int(os.getenv("MAX_ARTICLES_PER_SYMBOL", 8))
+ARTICLE_TOKEN_BUDGET = int(os.getenv("ARTICLE_TOKEN_BUDGET", 1500))
+FIELD_MAX_CHARS = int(os.getenv("ARTICLE_FIELD_MAX_CHARS", 400))
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", 0.7))
+SHINGLE_SIZE = 3
+NUM_HASHES = 64
+
+# Fields sent to the model, everything else (ids, urls, images, metadata) is dropped
+PROMPT_FIELDS = ("title", "description", "snippet", "source", "published_at")
+
+# Fixed hash family so signatures are stable across instances
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_HASH_PARAMS = [(_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME)) for _ in range(NUM_HASHES)]
+_WORD = re.compile(r"[a-z0-9$]+")
+
+# Rough token count, about four characters per token
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+# Hashed word shingles of text
+def shingles(text: str, size: int = SHINGLE_SIZE) -> set[int]:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+# MinHash signature of a shingle set
+def minhash(shingle_set: set[int]) -> list[int]:
+    return [min((a * shingle + b) % _MERSENNE_PRIME for shingle in shingle_set) for a, b in _HASH_PARAMS]
+
+# Estimated Jaccard similarity of two signatures
+def similarity(first: list[int], second: list[int]) -> float:
+    return sum(x == y for x, y in zip(first, second)) / NUM_HASHES
+
+# Text of an article used for scoring and deduplication
+def article_text(article: dict) -> str:
+    return " ".join(str(article.get(field) or "") for field in ("title", "description", "snippet", "main_text"))
+
+# Scores how much an article is about a stock, weighting where the stock is mentioned
+def score_article(article: dict, symbol: str, name: str | None) -> float:
+    terms = [re.compile(rf"(?<![\w$]){re.escape(symbol)}(?!\w)")]
+    if name:
+        terms.append(re.compile(re.escape(name), re.IGNORECASE))
+    weights = {"title": 3.0, "description": 2.0, "keywords": 2.0, "snippet": 1.0, "main_text": 1.0}
+    mentions = sum(
+        weight * len(term.findall(str(article.get(field) or "")))
+        for field, weight in weights.items()
+        for term in terms
+    )
+    return float(article.get("relevance_score") or 0) + 5.0 * min(mentions, 10.0)
+
+# Drops near-duplicate articles, keeping the best scored article of each cluster
+def deduplicate(scored: list[tuple[float, dict]], threshold: float = DUPLICATE_THRESHOLD) -> list[tuple[float, dict]]:
+    kept, signatures = [], []
+    for score, article in sorted(scored, key=lambda item: item[0], reverse=True):
+        signature = minhash(shingles(article_text(article)))
+        if any(similarity(signature, other) >= threshold for other in signatures):
+            continue
+        kept.append((score, article))
+        signatures.append(signature)
+    return kept
+
+# Keeps the prompt fields of an article, truncating long ones
+def trim_article(article: dict, max_chars: int = FIELD_MAX_CHARS) -> dict:
+    trimmed = {}
+    for field in PROMPT_FIELDS:
+        value = article.get(field) or (article.get("main_text") if field == "snippet" else None)
+        if value:
+            value = str(value)
+            trimmed[field] = value if len(value) <= max_chars else value[:max_chars].rsplit(" ", 1)[0] + "..."
+    return trimmed
+
+# Selects the top distinct articles about a stock that fit the token budget, returns trimmed articles and their urls
+def select_articles(articles: list, symbol: str, name: str | None = None, max_articles: int = MAX_ARTICLES, token_budget: int = ARTICLE_TOKEN_BUDGET) -> tuple[list, list]:
+    candidates = [
+        (score_article(article, symbol, name), article)
+        for article in articles
+        if (article.get("relevance_score") or 0) > MIN_PROVIDER_RELEVANCE
+    ]
+    selected, sources, used_tokens = [], [], 0
+    for _, article in deduplicate(candidates):
+        trimmed = trim_article(article)
+        tokens = estimate_tokens(str(trimmed))
+        if len(selected) >= max_articles or (len(selected) != 0 and used_tokens + tokens > token_budget):
+            break
+        selected.append(trimmed)
+        sources.append(article["url"])
+        used_tokens += tokens
+    return selected, sources
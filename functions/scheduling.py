@@ -0,0 +1,95 @@
+# PRIORITY SCHEDULING OF SYMBOLS BY NEWS VELOCITY, STANCE VOLATILITY AND EXPOSURE
+
+# Dependencies
+import os
+import time
+import heapq
+from typing import Iterable
+import google.cloud.firestore
+
+# Score weights, a symbol's score is the weighted sum of its smoothed signals
+NEWS_WEIGHT = float(os.getenv("SCHEDULE_NEWS_WEIGHT", 1.0))
+VOLATILITY_WEIGHT = float(os.getenv("SCHEDULE_VOLATILITY_WEIGHT", 4.0))
+EXPOSURE_WEIGHT = float(os.getenv("SCHEDULE_EXPOSURE_WEIGHT", 5.0))
+SMOOTHING = 0.5
+
+# Tiers by minimum score and their base refresh interval in seconds, quiet symbols double it per quiet run
+TIERS = [
+    ("hot", float(os.getenv("SCHEDULE_HOT_SCORE", 5.0)), 0),
+    ("warm", float(os.getenv("SCHEDULE_WARM_SCORE", 1.0)), int(os.getenv("SCHEDULE_WARM_INTERVAL", 2 * 60 * 60))),
+    ("cold", 0.0, int(os.getenv("SCHEDULE_COLD_INTERVAL", 6 * 60 * 60)))
+]
+MAX_INTERVAL_SECONDS = int(os.getenv("SCHEDULE_MAX_INTERVAL", 7 * 24 * 60 * 60))
+
+# Most symbols updated per run, and how early a symbol counts as due since runs start a few seconds apart
+MAX_SYMBOLS_PER_RUN = int(os.getenv("MAX_SYMBOLS_PER_RUN", 200))
+DUE_SLACK_SECONDS = 5 * 60
+
+# Score added per hour a symbol is overdue so deferred symbols are not starved
+AGING_PER_HOUR = float(os.getenv("SCHEDULE_AGING_PER_HOUR", 0.25))
+
+# Results that mean a symbol had no usable news rather than a failed run
+QUIET_RESULTS = ("No new articles", "Insufficient number of relevant articles")
+
+# Scores a symbol from its schedule state and whether a position is open
+def priority_score(schedule: dict | None, has_position: bool) -> float:
+    schedule = schedule or {}
+    return (
+        NEWS_WEIGHT * schedule.get("news_rate", 0.0)
+        + VOLATILITY_WEIGHT * schedule.get("volatility", 0.0)
+        + EXPOSURE_WEIGHT * (1.0 if has_position else 0.0)
+    )
+
+# Tier and base refresh interval of a score
+def get_tier(score: float) -> tuple[str, int]:
+    for name, min_score, interval in TIERS:
+        if score >= min_score:
+            return name, interval
+    return TIERS[-1][0], TIERS[-1][2]
+
+# Picks the due stocks with the highest priority, at most limit of them, returns their snapshots
+def select_due(stocks: Iterable[google.cloud.firestore.DocumentSnapshot], positions: set[str], limit: int = MAX_SYMBOLS_PER_RUN, now: float | None = None) -> list[google.cloud.firestore.DocumentSnapshot]:
+    now = time.time() if now is None else now
+    queue = []
+    for stock in stocks:
+        if not stock.exists:
+            continue
+        stock_data = stock.to_dict()
+        schedule = stock_data.get("schedule")
+        has_position = str(stock_data.get("symbol", "")).upper() in positions
+
+        # New symbols and open positions are always due
+        next_due = (schedule or {}).get("next_due", 0.0)
+        if next_due > now + DUE_SLACK_SECONDS and not has_position:
+            continue
+        if schedule is None:
+            # Never analyzed, ranked with hot symbols so new stocks get a first update quickly
+            score = TIERS[0][1] + EXPOSURE_WEIGHT * (1.0 if has_position else 0.0)
+        else:
+            overdue_hours = max(0.0, now - next_due) / 3600
+            score = priority_score(schedule, has_position) + AGING_PER_HOUR * min(overdue_hours, 24 * 7)
+        heapq.heappush(queue, (-score, next_due, stock.id, stock))
+    return [heapq.heappop(queue)[3] for _ in range(min(limit, len(queue)))]
+
+# Moves a symbol's schedule state after a run given its result, articles used and whether its stance changed
+def next_schedule(schedule: dict | None, status: bool, res, stance_changed: bool, has_position: bool, now: float | None = None) -> dict:
+    now = time.time() if now is None else now
+    schedule = dict(schedule or {})
+    if status == False and res not in QUIET_RESULTS:
+        # Provider or model failure, retried next run without backing off
+        schedule["next_due"] = now
+        return schedule
+
+    articles = len(res.get("sources", [])) if status == True else 0
+    schedule["news_rate"] = SMOOTHING * schedule.get("news_rate", 0.0) + (1 - SMOOTHING) * articles
+    schedule["volatility"] = SMOOTHING * schedule.get("volatility", 0.0) + (1 - SMOOTHING) * (1.0 if stance_changed else 0.0)
+    schedule["quiet_runs"] = 0 if articles != 0 else schedule.get("quiet_runs", 0) + 1
+
+    score = priority_score(schedule, has_position)
+    tier, interval = get_tier(score)
+    if tier != "hot":
+        interval = min(interval * 2 ** max(0, schedule["quiet_runs"] - 1), MAX_INTERVAL_SECONDS)
+    schedule["score"] = round(score, 3)
+    schedule["tier"] = tier
+    schedule["next_due"] = now + interval
+    return schedule
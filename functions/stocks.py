@@ -0,0 +1,137 @@
+# STOCK INDEXING, UPDATE AND ANALYTICS FUNCTIONS
+
+# Dependencies, the update pipeline and analytics are imported inside the functions that run them
+from firebase_functions import https_fn, options, scheduler_fn, tasks_fn
+from firebase_functions.options import RetryConfig, RateLimits
+from firebase_admin import firestore
+import google.cloud.firestore
+import google
+import io
+import json
+import os
+from history import get_recent_updates
+from market_calendar import is_market_open, load_holidays, refresh_holidays
+from indexing import fetch_profile, parse_symbols, index_symbols, PROFILE_MAX_AGE_HOURS, MAX_BULK_SYMBOLS, INDEX_TIMEOUT_SECONDS
+from helper import log
+
+# Whether the scheduled update runs in-process ("inline") or is sharded into update tasks ("tasks")
+UPDATE_DISPATCH_MODE = os.getenv("UPDATE_DISPATCH_MODE", "inline")
+
+# Timeout of an update run, sized for an inline run of MAX_SYMBOLS_PER_RUN symbols so a task of UPDATE_TASK_BATCH_SIZE symbols fits with room for provider backoff
+UPDATE_TIMEOUT_SECONDS = 1800
+
+# Indexes stock on first mention (one time)
+@https_fn.on_request()
+def index_stock(req: https_fn.Request) -> https_fn.Response:
+
+    # Request params
+    symbol = req.args.get("symbol").lower()
+
+    # Gets general info from finnhub
+    status, profile = fetch_profile(symbol)
+    if status == True:
+        firestore_client: google.cloud.firestore.Client = firestore.client()
+        firestore_client.collection("stocks").document(symbol).set(profile, merge=True)
+        return https_fn.Response(f"{symbol} was indexed.", status=200)
+    return https_fn.Response(f"{symbol} failed to be indexed.", status=400)
+
+# Indexes many stocks from a JSON symbol list or a CSV body, streaming one JSON line of progress per symbol
+@https_fn.on_request(timeout_sec=INDEX_TIMEOUT_SECONDS)
+def index_stocks(req: https_fn.Request) -> https_fn.Response:
+
+    # Request params, ?max_age_hours=0 fetches every profile again
+    max_age_hours = float(req.args.get("max_age_hours", PROFILE_MAX_AGE_HOURS))
+    if req.is_json:
+        symbols = parse_symbols(str(symbol) for symbol in req.get_json().get("symbols", []))
+    else:
+        symbols = parse_symbols(io.TextIOWrapper(req.stream, encoding="utf-8"))
+    if len(symbols) == 0:
+        return https_fn.Response("No symbols given.", status=400)
+    if len(symbols) > MAX_BULK_SYMBOLS:
+        return https_fn.Response(f"At most {MAX_BULK_SYMBOLS} symbols can be indexed at once.", status=400)
+
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    progress = index_symbols(firestore_client, symbols, max_age_hours=max_age_hours)
+    return https_fn.Response(
+        (json.dumps(event) + "\n" for event in progress),
+        status=200,
+        content_type="application/x-ndjson"
+    )
+
+# Updates stock entry on recurring basis
+@https_fn.on_request()
+def update_stocks(req: https_fn.Request) -> https_fn.Response:
+
+    # Updates indexed stocks in parallel
+    from updater import update_all_stocks
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    updated_stocks, failed_stocks = update_all_stocks(firestore_client)
+
+    if len(updated_stocks) != 0:
+        return https_fn.Response(f"Updated Stocks: {updated_stocks}\nFailed Stocks: {failed_stocks}", status=200)
+    return https_fn.Response(f"No stock updated. Insufficient information.", status=400)
+
+# Returns a page of a stock's updates, newest first
+@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["get"]))
+def stock_updates(req: https_fn.Request) -> https_fn.Response:
+
+    # Request params
+    symbol = req.args.get("symbol")
+    if not symbol:
+        return https_fn.Response("No symbol given.", status=400)
+    symbol = symbol.upper()
+    try:
+        limit = max(1, min(int(req.args.get("limit", 20)), 100))
+    except ValueError:
+        return https_fn.Response("Limit must be a number.", status=400)
+    cursor = req.args.get("cursor")
+
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    updates, next_cursor = get_recent_updates(firestore_client, symbol, limit=limit, cursor=cursor)
+    return https_fn.Response(
+        json.dumps({"updates": updates, "next_cursor": next_cursor}, default=str),
+        status=200,
+        content_type="application/json"
+    )
+
+# Refreshes the holiday corrections from Finnhub once a day, before the first update run
+@scheduler_fn.on_schedule(schedule="0 6 * * *", timezone=scheduler_fn.Timezone("America/New_York"))
+def refresh_market_calendar(event: scheduler_fn.ScheduledEvent) -> None:
+    if refresh_holidays() == False:
+        log("Market holidays were not refreshed, open checks use the stored corrections")
+
+# Runs update stock function when market conditions satisfied
+@scheduler_fn.on_schedule(schedule="0 10-15 * * 1-5", timezone=scheduler_fn.Timezone("America/New_York"), timeout_sec=UPDATE_TIMEOUT_SECONDS)
+def update_stocks_auto(event: scheduler_fn.ScheduledEvent) -> None:
+
+    # Checks market status against the local trading calendar and the stored holiday corrections
+    load_holidays()
+    if is_market_open():
+        from updater import update_all_stocks, enqueue_update_batches
+        firestore_client: google.cloud.firestore.Client = firestore.client()
+        if UPDATE_DISPATCH_MODE == "tasks":
+            log(f"Enqueued {enqueue_update_batches(firestore_client)} update tasks")
+        else:
+            updated_stocks, failed_stocks = update_all_stocks(firestore_client)
+            log(f"Updated Stocks: {updated_stocks}")
+            log(f"Failed Stocks: {failed_stocks}")
+    else:
+        log("Market is closed")
+
+# Updates one shard of the watch list enqueued by update_stocks_auto
+@tasks_fn.on_task_dispatched(retry_config=RetryConfig(max_attempts=3, min_backoff_seconds=60),
+                             rate_limits=RateLimits(max_concurrent_dispatches=10),
+                             timeout_sec=UPDATE_TIMEOUT_SECONDS)
+def update_stock_batch(req: tasks_fn.CallableRequest) -> str:
+    from updater import update_stock_ids
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    updated_stocks, failed_stocks = update_stock_ids(firestore_client, req.data["stock_ids"])
+    return f"Updated Stocks: {updated_stocks}\nFailed Stocks: {failed_stocks}"
+
+# Recomputes stance and price analytics over new updates after each trading day
+@scheduler_fn.on_schedule(schedule="0 22 * * 1-5")
+def update_stock_analytics(event: scheduler_fn.ScheduledEvent) -> None:
+    from analytics import update_analytics
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    state = update_analytics(firestore_client)
+    log(f"Analytics checkpoint: {state.get('checkpoint')}")
@@ -0,0 +1,125 @@
+# TIMING SPANS AND PROVIDER CALL METRICS
+
+# Dependencies
+import os
+import json
+import time
+import inspect
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+# Export mode: "json" writes structured logs for Cloud Logging, "otel" also records OpenTelemetry spans, "off" does nothing
+TELEMETRY_MODE = os.getenv("FRED_TELEMETRY", "json").lower()
+
+# Counters of the invocation running in the current context, the process-wide counters collect anything outside one
+_counters: Counter = Counter()
+_counters_lock = threading.Lock()
+_scope_counters: ContextVar[Counter | None] = ContextVar("telemetry_counters", default=None)
+_tracer = None
+if TELEMETRY_MODE == "otel":
+    try:
+        from opentelemetry import trace
+        _tracer = trace.get_tracer("fred-ai")
+    except ImportError:
+        TELEMETRY_MODE = "json"
+
+# Writes one structured log line, Cloud Logging parses JSON written to stdout
+def emit(message: str, **fields) -> None:
+    print(json.dumps({"severity": "INFO", "message": message, **fields}, default=str))
+
+# Adds value to a counter, labels split the counter (e.g. provider="finnhub")
+def increment(name: str, value: int | float = 1, **labels) -> None:
+    if TELEMETRY_MODE == "off" or not value:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    counters = _scope_counters.get()
+    with _counters_lock:
+        (counters if counters is not None else _counters)[key] += value
+
+# Times a block of work and logs its duration, attributes describe it (e.g. symbol="AAPL")
+@contextmanager
+def span(name: str, **attributes):
+    if TELEMETRY_MODE == "off":
+        yield
+        return
+    started = time.perf_counter()
+    error = None
+    otel_span = _tracer.start_as_current_span(name, attributes=attributes) if _tracer is not None else None
+    if otel_span is not None:
+        otel_span.__enter__()
+    try:
+        yield
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        if otel_span is not None:
+            otel_span.__exit__(None, None, None)
+        emit(f"span {name}", span=name, duration_ms=round((time.perf_counter() - started) * 1000, 3), attributes=attributes, error=error)
+
+# Wraps function in a span of the same name
+def traced(name: str):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Logs and resets every counter of the current invocation accumulated since the last flush
+def flush_metrics(scope: str) -> dict:
+    if TELEMETRY_MODE == "off":
+        return {}
+    scoped = _scope_counters.get()
+    with _counters_lock:
+        source = scoped if scoped is not None else _counters
+        counters = dict(source)
+        source.clear()
+    metrics = {}
+    for (name, labels), value in sorted(counters.items()):
+        label = ",".join(f"{key}={value}" for key, value in labels)
+        metrics[f"{name}{{{label}}}" if label else name] = value
+    emit(f"metrics {scope}", scope=scope, metrics=metrics)
+    return metrics
+
+# Counts the metrics of one invocation apart from others running on the instance and logs them when it ends
+@contextmanager
+def metrics_scope(scope: str):
+    token = _scope_counters.set(Counter())
+    try:
+        yield
+    finally:
+        flush_metrics(scope)
+        _scope_counters.reset(token)
+
+# Runs function (or iterates a generator function) in its own metrics scope
+def metered(scope: str):
+    def decorator(function):
+        if inspect.isgeneratorfunction(function):
+            @wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                with metrics_scope(scope):
+                    yield from function(*args, **kwargs)
+            return generator_wrapper
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with metrics_scope(scope):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Binds function to the current invocation's counters, for jobs handed to worker threads which start without them
+def carry(function):
+    counters = _scope_counters.get()
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        token = _scope_counters.set(counters)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _scope_counters.reset(token)
+    return wrapper
@@ -0,0 +1,71 @@
+# PAPER TRADING STAGE FOR STOCK UPDATES
+
+# Dependencies
+from helper import log
+import google.cloud.firestore
+from broker import get_broker_state, OrderQueue
+from executions import execution_ref
+
+# Notional dollar amount traded per signal
+ORDER_AMOUNT = 100
+
+# Decides which orders a signal calls for given buying power and whether a position is open
+def plan_orders(symbol: str, signal: str, buying_power: float | None, has_position: bool | None, amount: int = ORDER_AMOUNT) -> list[dict]:
+    if signal == "bullish":
+        # Buys stock in case of bullish signal
+        if buying_power is not None and buying_power > amount:
+            return [{"kind": "buy", "symbol": symbol, "notional": amount}]
+    elif signal == "bearish":
+        # Liquadates positions in case of bearish signal, otherwise sells shorts on stock
+        if has_position:
+            return [{"kind": "liquidate", "symbol": symbol, "percent": 100}]
+        return [{"kind": "sell", "symbol": symbol, "notional": amount}]
+    return []
+
+# Utilizes post sentiments about stocks to paper trade
+def run_trade_stage(firestore_client: google.cloud.firestore.Client, update_id: str, update: dict) -> tuple[bool, dict]:
+    symbol, signal = update["symbol"], update["stance"]
+    if signal not in ("bullish", "bearish"):
+        return True, {}
+
+    status, state = get_broker_state()
+    if status == False:
+        return False, state
+
+    # Resubmits the orders planned by an earlier attempt of this stage, their client order ids keep Alpaca from placing them twice
+    ledger_ref = execution_ref(firestore_client, update_id, "trade")
+    orders = (ledger_ref.get(field_paths=["orders"]).to_dict() or {}).get("orders")
+    if orders is not None:
+        state.invalidate()
+    else:
+        # Plans against the shared ledger so concurrent updates see each other's orders
+        with state.lock:
+            has_position = state.has_position(symbol)
+            orders = plan_orders(symbol, signal, state.buying_power, has_position)
+            for order in orders:
+                state.apply(order)
+        if signal == "bullish" and len(orders) == 0:
+            log("Insufficient funds")
+        elif signal == "bearish" and not has_position:
+            log(f"No open position found for symbol: {symbol}")
+
+        # Records the plan before submitting so a recovered stage resubmits these orders rather than planning new ones
+        ledger_ref.update({"orders": orders})
+
+    # Executes orders and records them on the update and in orders
+    queue = OrderQueue()
+    for order in orders:
+        queue.add(order, client_order_id=f"{update_id}-{order['kind']}")
+    actions = []
+    for order, status, res in queue.submit():
+        if status == True:
+            actions.append(res)
+        else:
+            log(res)
+            state.invalidate()
+    if len(actions) == 0:
+        return True, {}
+    return True, {
+        "fields": {"associated_actions": actions},
+        "documents": [("orders", action) for action in actions]
+    }
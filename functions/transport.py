@@ -0,0 +1,140 @@
+# SHARED HTTP TRANSPORT FOR EXTERNAL PROVIDERS
+
+# Dependencies
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from requests.adapters import HTTPAdapter
+import helper
+import telemetry
+
+# Provider endpoints and free-tier request quotas (requests per period in seconds), the news APIs allow about 100 requests a day
+PROVIDERS = {
+    "finnhub": {
+        "base_url": os.getenv("FINNHUB_BASE_URL", "https://finnhub.io"),
+        "rate": int(os.getenv("FINNHUB_RATE_LIMIT", 60)),
+        "period": 60.0
+    },
+    "alpaca": {
+        "base_url": os.getenv("ALPACA_BASE_URL", "https://paper-api.alpaca.markets"),
+        "rate": int(os.getenv("ALPACA_RATE_LIMIT", 200)),
+        "period": 60.0
+    },
+    "news": {
+        "base_url": os.getenv("NEWS_BASE_URL", "https://api.thenewsapi.com"),
+        "rate": int(os.getenv("NEWS_RATE_LIMIT", 100)),
+        "period": float(os.getenv("NEWS_RATE_PERIOD", 24 * 60 * 60))
+    },
+    "news_extra": {
+        "base_url": os.getenv("NEWS_EXTRA_BASE_URL", "https://newsapi.org"),
+        "rate": int(os.getenv("NEWS_EXTRA_RATE_LIMIT", 100)),
+        "period": float(os.getenv("NEWS_EXTRA_RATE_PERIOD", 24 * 60 * 60))
+    }
+}
+
+# Timeouts and retry policy
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 20))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", 3))
+BACKOFF_BASE = float(os.getenv("HTTP_BACKOFF_BASE", 0.5))
+BACKOFF_CAP = float(os.getenv("HTTP_BACKOFF_CAP", 30))
+MAX_RATE_WAIT = float(os.getenv("HTTP_MAX_RATE_WAIT", 60))
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 16))
+
+# Token bucket limiting how quickly requests are sent to a provider
+class RateLimiter:
+
+    def __init__(self, rate: int, period: float):
+        self.capacity = rate
+        self.tokens = float(rate)
+        self.fill_rate = rate / period
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    # Waits for a token, returns False if the wait would exceed max_wait
+    def acquire(self, max_wait: float = MAX_RATE_WAIT) -> bool:
+        deadline = time.monotonic() + max_wait
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.fill_rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.fill_rate
+            if now + wait > deadline:
+                return False
+            time.sleep(wait)
+
+# Raised when a provider's rate limiter cannot grant a request in time
+class RateLimitExceeded(Exception):
+    pass
+
+_sessions: dict[str, requests.Session] = {}
+_limiters = {name: RateLimiter(config["rate"], config["period"]) for name, config in PROVIDERS.items()}
+_sessions_lock = threading.Lock()
+
+# Returns pooled keep-alive session for provider
+def get_session(provider: str) -> requests.Session:
+    if provider not in _sessions:
+        with _sessions_lock:
+            if provider not in _sessions:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _sessions[provider] = session
+    return _sessions[provider]
+
+# Computes delay before next attempt, honouring Retry-After when sent
+def get_backoff(attempt: int, response: requests.Response | None = None) -> float:
+    if response is not None and "Retry-After" in response.headers:
+        retry_after = response.headers["Retry-After"]
+        try:
+            return min(BACKOFF_CAP, max(0.0, float(retry_after)))
+        except ValueError:
+            try:
+                return min(BACKOFF_CAP, max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time()))
+            except (TypeError, ValueError):
+                pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+# Sends request to provider with pooling, timeouts, rate limiting and retries, timed as a span
+def request(provider: str, method: str, path: str, **kwargs) -> requests.Response:
+    with telemetry.span(f"provider.{provider}", method=method, path=path.split("?")[0]):
+        return _send(provider, method, path, **kwargs)
+
+def _send(provider: str, method: str, path: str, **kwargs) -> requests.Response:
+    url = f"{PROVIDERS[provider]['base_url']}/{path}"
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    # Non-idempotent requests are only retried when the provider rejected them outright
+    retry_statuses = RETRY_STATUSES if method.upper() in ("GET", "DELETE") else {429}
+    session = get_session(provider)
+    attempt = 0
+    while True:
+        if not _limiters[provider].acquire():
+            telemetry.increment("provider_rate_limited", provider=provider)
+            raise RateLimitExceeded(f"Rate limit for {provider} exceeded")
+        try:
+            response = session.request(method, url, **kwargs)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            telemetry.increment("provider_calls", provider=provider, status=type(e).__name__)
+            if attempt >= MAX_RETRIES or method.upper() not in ("GET", "DELETE"):
+                raise
+            delay = get_backoff(attempt)
+            helper.log(f"{provider} {method} {path} failed ({type(e).__name__}), retrying in {delay:.2f}s")
+        else:
+            telemetry.increment("provider_calls", provider=provider, status=response.status_code)
+            telemetry.increment("provider_bytes", len(response.content), provider=provider)
+            if response.status_code not in retry_statuses or attempt >= MAX_RETRIES:
+                return response
+            delay = get_backoff(attempt, response)
+            helper.log(f"{provider} {method} {path} returned {response.status_code}, retrying in {delay:.2f}s")
+        telemetry.increment("provider_retries", provider=provider)
+        time.sleep(delay)
+        attempt += 1
@@ -0,0 +1,60 @@
+# TWITTER STAGE FOR STOCK UPDATES
+
+# Dependencies
+import os
+import google.cloud.firestore
+from helper import get_credentials, log
+from fred_ai import generate_content
+import telemetry
+
+# Twitter API endpoint, overridable to point at a local stand-in
+TWITTER_BASE_URL = os.getenv("TWITTER_BASE_URL", "https://api.twitter.com")
+
+# Utilizes post sentiments about stocks to post to twitter
+def run_tweet_stage(firestore_client: google.cloud.firestore.Client, update_id: str, update: dict) -> tuple[bool, dict | str]:
+
+    # Summarizes summary even further via AI
+    summary = generate_content(
+        contents=f"Summarize the following summary of stock news into an objective, engaging 240 character tweet. The word limit is very strict and cannot go over 240 characters but can be below. Summary: {update['summary']}",
+    )
+
+    # Defines tweet body
+    poll = {
+        "options": ["Bearish", "Bullish", "Neutral"],
+        "duration_minutes": 60 * 24
+    }
+    payload = {
+        "text": f"{summary.text}\nHow does this news make you feel?",
+        "poll": poll
+    }
+
+    # Make the request, the OAuth client is imported here so it only loads when tweeting
+    from requests_oauthlib import OAuth1Session
+    oauth = OAuth1Session(
+        get_credentials("twitter_api_keys")[0],
+        client_secret=get_credentials("twitter_api_keys")[1],
+        resource_owner_key=get_credentials("twitter_access_tokens")[0],
+        resource_owner_secret=get_credentials("twitter_access_tokens")[1],
+    )
+
+    # Making the request
+    with telemetry.span("provider.twitter"):
+        response = oauth.post(
+            f"{TWITTER_BASE_URL}/2/tweets",
+            json=payload,
+            timeout=30
+        )
+    telemetry.increment("provider_calls", provider="twitter", status=response.status_code)
+
+    if response.status_code != 201:
+        return False, "Request returned an error: {} {}".format(response.status_code, response.text)
+
+    log("Response code: {}".format(response.status_code))
+
+    # Parses response for tweet id
+    return True, {
+        "fields": {
+            "associated_tweet_id": response.json()["data"]["id"],
+            "associated_tweet_summary": summary.text
+        }
+    }
@@ -0,0 +1,125 @@
+# UPDATE JOB FOR INDEXED STOCKS
+
+# Dependencies
+import os
+from typing import Iterable
+import google.cloud.firestore
+from firebase_admin import firestore, functions
+from fred_ai import get_stock_updates_batch
+from batch_writer import BatchWriter
+from history import push_recent_update
+from broker import get_broker_state
+from scheduling import select_due, next_schedule, QUIET_RESULTS
+from ingest import cursor_write, remember_cursor
+import telemetry
+
+# Number of stocks handled by each update task when the run is sharded
+UPDATE_TASK_BATCH_SIZE = int(os.getenv("UPDATE_TASK_BATCH_SIZE", 25))
+
+# Records an analysis as a new update and moves the stock's live stance in one commit, along with any extra writes (e.g. the news cursor)
+def record_stock_update(writer: BatchWriter, stock: google.cloud.firestore.DocumentSnapshot, res: dict, *extra_writes: tuple) -> tuple[bool, str]:
+
+    stock_data = stock.to_dict()
+    stance = res["stance"] if (res["stance"] == "bearish" or res["stance"] == "bullish") else "neutral"
+
+    # Create stock update and update stock index and stance
+    update_ref = writer.firestore_client.collection("updates").document()
+    writer.write(
+        ("set", update_ref, {
+            "symbol": stock_data["symbol"],
+            "name": stock_data["name"],
+            "summary": res["summary"],
+            "prev_stance": stock_data.get("live_stance", "neutral"),
+            "stance": stance,
+            "defense": res["defense"],
+            "sources": res["sources"],
+            "price": res["price"],
+            "timestamp": firestore.SERVER_TIMESTAMP
+        }),
+        ("update", stock.reference, {
+            "live_stance": stance,
+            "updates": push_recent_update(stock_data.get("updates"), update_ref.id)
+        }),
+        *extra_writes
+    )
+    return True, update_ref.id
+
+# Symbols with an open position, empty when the broker cannot be reached
+def get_positions() -> set[str]:
+    status, state = get_broker_state()
+    if status == False:
+        return set()
+    return {symbol.upper() for symbol in state.positions}
+
+# Updates the given stocks concurrently, returns ids of updated and failed stocks
+@telemetry.metered("update_stocks")
+@telemetry.traced("update_stocks")
+def update_stocks(firestore_client: google.cloud.firestore.Client, stocks: Iterable[google.cloud.firestore.DocumentSnapshot]) -> tuple[list, list]:
+
+    # Looks for updates on every stock, analyzing news in batches
+    indexed_stocks = {}
+    with telemetry.span("load_stocks"):
+        for stock in stocks:
+            if stock.exists:
+                indexed_stocks[stock.get("symbol")] = stock
+    stock_updates, cursors = get_stock_updates_batch([(symbol, stock.get("name")) for symbol, stock in indexed_stocks.items()])
+    failed = [indexed_stocks[symbol].id for symbol, (status, _) in stock_updates.items() if status == False]
+
+    # Records successful updates and every stock's next refresh in batched commits
+    # News cursors only move with a recorded update or a quiet result, so failed symbols refetch their articles next run
+    updated, processed = [], []
+    positions = get_positions()
+    with telemetry.span("firestore_writes"), BatchWriter(firestore_client) as writer:
+        for symbol, (status, res) in stock_updates.items():
+            stock_data = indexed_stocks[symbol].to_dict()
+            stance_changed = False
+            stock_writes = []
+            if symbol in cursors and (status == True or res in QUIET_RESULTS):
+                processed.append(symbol)
+                cursor = cursor_write(symbol, cursors[symbol][0])
+                if cursor is not None:
+                    stock_writes.append(cursor)
+            if status == True:
+                stance = res["stance"] if res["stance"] in ("bearish", "bullish") else "neutral"
+                stance_changed = stance != stock_data.get("live_stance", "neutral")
+            schedule = next_schedule(stock_data.get("schedule"), status, res, stance_changed, symbol.upper() in positions)
+            stock_writes.append(("update", indexed_stocks[symbol].reference, {"schedule": schedule}))
+            if status == True:
+                record_stock_update(writer, indexed_stocks[symbol], res, *stock_writes)
+                updated.append(indexed_stocks[symbol].id)
+            else:
+                writer.write(*stock_writes)
+
+    # Advances in-memory cursors only once their writes are committed
+    for symbol in processed:
+        remember_cursor(symbol, *cursors[symbol])
+    telemetry.increment("stocks_updated", len(updated))
+    telemetry.increment("stocks_failed", len(failed))
+    return updated, failed
+
+# Picks the indexed stocks due this run, highest priority first and bounded per run
+def get_due_stocks(firestore_client: google.cloud.firestore.Client, fields: list[str] | None = None) -> list[google.cloud.firestore.DocumentSnapshot]:
+    query = firestore_client.collection("stocks")
+    stocks = query.select(fields).stream() if fields is not None else query.stream()
+    with telemetry.span("schedule_stocks"):
+        due = select_due(stocks, get_positions())
+    telemetry.increment("stocks_scheduled", len(due))
+    return due
+
+# Updates every indexed stock that is due
+def update_all_stocks(firestore_client: google.cloud.firestore.Client) -> tuple[list, list]:
+    return update_stocks(firestore_client, get_due_stocks(firestore_client))
+
+# Updates the stocks with the given document ids
+def update_stock_ids(firestore_client: google.cloud.firestore.Client, stock_ids: list[str]) -> tuple[list, list]:
+    stocks_ref = firestore_client.collection("stocks")
+    return update_stocks(firestore_client, firestore_client.get_all([stocks_ref.document(stock_id) for stock_id in stock_ids]))
+
+# Shards the due stocks into batches and enqueues one update task per batch, returns number of tasks
+def enqueue_update_batches(firestore_client: google.cloud.firestore.Client, batch_size: int = UPDATE_TASK_BATCH_SIZE) -> int:
+    stock_ids = [stock.id for stock in get_due_stocks(firestore_client, fields=["symbol", "schedule"])]
+    task_queue = functions.task_queue("update_stock_batch")
+    batches = [stock_ids[i:i + batch_size] for i in range(0, len(stock_ids), batch_size)]
+    for batch in batches:
+        task_queue.enqueue({"stock_ids": batch})
+    return len(batches)
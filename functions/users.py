@@ -0,0 +1,66 @@
+# USER FUNCTIONS CALLED BY THE SIGN-IN WEBHOOKS
+
+# Dependencies
+from firebase_functions import https_fn, options, scheduler_fn
+from firebase_admin import firestore
+import google.cloud.firestore
+import google
+from datetime import datetime, timezone, timedelta
+from activity import record_sign_in, rollup_activity
+from helper import parse_data, log
+
+# Runs on user sign-up
+@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["post"]))
+def addUser(req: https_fn.Request) -> https_fn.Response:
+
+    # Retrieves relevant clerk data
+    request_body = req.get_json()["data"]
+
+    # Define User object according to schema
+    user = {
+        "id": parse_data("id", request_body),
+        "first_name": parse_data("first_name", request_body),
+        "last_name": parse_data("last_name", request_body),
+        "created": parse_data("updated_at", request_body),
+        "active_at": [],
+        "last_active_at": parse_data("last_sign_in_at", request_body),
+        "sign_ins": 0,
+        "email_address": parse_data("email_address", request_body["email_addresses"][0]) if (parse_data("email_addresses", request_body) != None) else None,
+        "avatar": parse_data("profile_image_url", request_body),
+        "watchlist": [],
+        "searched": []
+    }
+
+    # Adds to firestore
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    firestore_client.collection("users").document(user["id"]).set(user)
+    if user["last_active_at"] != None:
+        record_sign_in(firestore_client, user["id"], user["last_active_at"])
+
+    # Send back a message that we've successfully updated user
+    return https_fn.Response(f"User with ID {user["id"]} added.")
+
+# Runs on user sign-in
+@https_fn.on_request(cors=options.CorsOptions(cors_origins="*", cors_methods=["post"]))
+def updateUser(req: https_fn.Request) -> https_fn.Response:
+
+    # Retrieves relevant clerk data
+    request_body = req.get_json()["data"]
+    user_id = parse_data("user_id", request_body)
+    active_at = parse_data("last_active_at", request_body)
+
+    if active_at != None:
+
+        # Appends sign-in to activity log without reading the user
+        firestore_client: google.cloud.firestore.Client = firestore.client()
+        record_sign_in(firestore_client, user_id, active_at)
+
+    # Send back a message that we've successfully updated user
+    return https_fn.Response(f"User with ID {user_id} updated.")
+
+# Rolls up the previous UTC day's sign-ins
+@scheduler_fn.on_schedule(schedule="15 0 * * *")
+def rollup_user_activity(event: scheduler_fn.ScheduledEvent) -> None:
+    firestore_client: google.cloud.firestore.Client = firestore.client()
+    rollup = rollup_activity(firestore_client, datetime.now(timezone.utc).date() - timedelta(days=1))
+    log(f"Activity rollup: {rollup['day']} {rollup['active_users']} users {rollup['sign_ins']} sign-ins")
@@ -0,0 +1,47 @@
+# WORKER POOL FOR CONCURRENT PROVIDER-BOUND JOBS
+
+# Dependencies
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable
+from helper import log
+import telemetry
+
+# Default number of symbols processed at once
+DEFAULT_WORKERS = int(os.getenv("UPDATE_WORKERS", 16))
+
+# Maximum number of concurrent in-flight calls per provider
+PROVIDER_LIMITS = {
+    "finnhub": int(os.getenv("FINNHUB_CONCURRENCY", 4)),
+    "news": int(os.getenv("NEWS_CONCURRENCY", 4)),
+    "gemini": int(os.getenv("GEMINI_CONCURRENCY", 8)),
+    "alpaca": int(os.getenv("ALPACA_CONCURRENCY", 4)),
+    "firestore": int(os.getenv("FIRESTORE_CONCURRENCY", 16))
+}
+_provider_semaphores = {name: threading.BoundedSemaphore(limit) for name, limit in PROVIDER_LIMITS.items()}
+
+# Holds one of the provider's concurrency slots for the duration of a call
+@contextmanager
+def provider_slot(provider: str):
+    with _provider_semaphores[provider]:
+        yield
+
+# Runs job over every item in parallel and reports which items succeeded or failed
+def run_concurrently(items: Iterable, job: Callable[[Any], tuple[bool, Any]], key: Callable[[Any], str] = str, max_workers: int = DEFAULT_WORKERS) -> tuple[list, list]:
+    succeeded, failed = [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(telemetry.carry(job), item): key(item) for item in items}
+        for future in as_completed(futures):
+            item_key = futures[future]
+            try:
+                status, res = future.result()
+            except Exception as e:
+                status, res = False, f"{type(e).__name__}: {e}"
+            if status == True:
+                succeeded.append((item_key, res))
+            else:
+                log(f"{item_key} failed: {res}")
+                failed.append((item_key, res))
+    return succeeded, failed